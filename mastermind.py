@@ -7,27 +7,213 @@ Created on Fri Jun 16 17:35:00 2017
 Updated w/bug fix 6/17/17
 @author: dd
 """
+import asyncio
+import os
 import random
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 
-Colors = ['Red', 'Yel', 'Grn', 'Blu', 'Blk', 'Wht']
+# names for up to 10 colors; the game uses the first Ncolors of them
+All_colors = ['Red', 'Yel', 'Grn', 'Blu', 'Blk', 'Wht',
+              'Org', 'Pur', 'Pnk', 'Brn']
+Colors = All_colors[:6]
 Ncolors = len(Colors)
 Nholes = 4
 
+# How the next guess is picked, one of:
+#   'random'   - any one of the still possible codes
+#   'minimax'  - Knuth's: smallest worst-case number of codes left
+#   'expected' - smallest expected number of codes left
+#   'entropy'  - most information (entropy) in the score
+Strategy = 'random'
+# Spread the guess scoring over worker processes when there are
+# more than this many (guess, possible code) pairs to score
+Parallel_pairs = 4000000
+# Remember the guesses a scoring strategy picks, by game history, in an
+# "opening book" saved in this file (filled in with strategy, Ncolors, Nholes)
+Book_file = 'mastermind_book_{}_{}x{}.npz'
+# and keep at most this many of them (least recently used ones dropped)
+Book_size = 200000
+# Use a full (Ncodes x Ncodes) score table for up to this many codes,
+# above that scores are worked out from the code digits as needed
+Dense_codes = 4096
+# and then in chunks of at most this many (guess, code) pairs at a time
+Chunk_pairs = 2000000
+# With more codes than this, score at most this many candidate guesses,
+# picked from the still possible codes, instead of every code
+Max_candidates = 2000
+
+
+def set_game(ncolors=6, nholes=4):
+    """
+    Set up the game for ncolors colors and nholes holes.
+    Scores are 10*black + white so at most 9 holes are allowed.
+    """
+    global Colors, Ncolors, Nholes, _score_table, _all_codes
+    if not (1 <= ncolors <= len(All_colors)) or not (1 <= nholes <= 9):
+        raise ValueError("Need 1 to " + str(len(All_colors)) +
+                         " colors and 1 to 9 holes")
+    if (ncolors, nholes) != (Ncolors, Nholes):
+        # the workers are set up for the previous game
+        close_guess_pool()
+    Colors = All_colors[:ncolors]
+    Ncolors = ncolors
+    Nholes = nholes
+    # forget the tables for the previous game
+    _score_table = None
+    _all_codes = None
+
 
 def all_codes():
-    # create a list of lists each with single color
-    out = list()
-    for clr in Colors:
-        out.append([clr])
-    # create bigger list (more) by adding in turn each color to the
-    # current list (out). Do this Nholes-1 times:
-    for indholes in range(Nholes - 1):
-        more = list()
-        for ind in range(len(out)):
-            for indclr in range(Ncolors):
-                more.append(out[ind] + [Colors[indclr]])
-        out = more
-    return out
+    """
+    Return all the codes as packed integers: each code is the base-Ncolors
+    number whose digits are the color indices, first hole most significant.
+
+    It is made once per game and shared, so it is read-only.
+
+    >>> print(len(all_codes()), code_names(all_codes()[7]))
+    1296 ['Red', 'Red', 'Yel', 'Yel']
+    """
+    global _all_codes
+    if _all_codes is None:
+        _all_codes = np.arange(Ncolors**Nholes, dtype=np.int64)
+        _all_codes.setflags(write=False)
+    return _all_codes
+
+
+# all the codes, made by all_codes() when first needed
+_all_codes = None
+
+
+def code_digits(codes):
+    """
+    Unpack codes into an array of color indices, adding a last axis
+    of length Nholes.
+
+    >>> print(code_digits([0, 1, 7]))
+    [[0 0 0 0]
+     [0 0 0 1]
+     [0 0 1 1]]
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    powers = Ncolors ** np.arange(Nholes - 1, -1, -1, dtype=np.int64)
+    return ((codes[..., np.newaxis] // powers) % Ncolors).astype(np.uint8)
+
+
+def pack_code(names):
+    """
+    Return the packed code for a list of color names.
+
+    >>> print(pack_code(['Red', 'Red', 'Yel', 'Yel']))
+    7
+    """
+    code = 0
+    for name in names:
+        code = Ncolors * code + Colors.index(name)
+    return code
+
+
+def code_names(code_ind):
+    """
+    Return the list of color names for the code with index code_ind.
+
+    >>> print(code_names(1295))
+    ['Wht', 'Wht', 'Wht', 'Wht']
+    """
+    return [Colors[idig] for idig in code_digits(code_ind)]
+
+
+def color_counts(digits):
+    """
+    Count each color in the codes' digits, last axis becomes Ncolors long.
+    """
+    counts = np.zeros(digits.shape[:-1] + (Ncolors,), dtype=np.uint8)
+    for iclr in range(Ncolors):
+        counts[..., iclr] = (digits == iclr).sum(axis=-1)
+    return counts
+
+
+def score_codes(codes1, codes2):
+    """
+    Return the check_codes() scores of codes1 against codes2 (packed codes,
+    numpy broadcasting applies) as uint8, worked out from the digits:
+    right color anywhere is the sum of the per-color count minimums and
+    right place is the number of equal digits.
+
+    >>> print(score_codes(7, [7, 0, 42, 1295]))
+    [40 20 22  0]
+    """
+    digits1 = code_digits(codes1)
+    digits2 = code_digits(codes2)
+    counts1 = color_counts(digits1)
+    counts2 = color_counts(digits2)
+    scores = np.minimum(counts1[..., 0], counts2[..., 0])
+    for iclr in range(1, Ncolors):
+        scores = scores + np.minimum(counts1[..., iclr], counts2[..., iclr])
+    for ihole in range(Nholes):
+        # 10*black + white = 9*black + (black + white)
+        scores += np.uint8(9) * (digits1[..., ihole] ==
+                                 digits2[..., ihole]).astype(np.uint8)
+    return scores
+
+
+def score_matrix():
+    """
+    Return the (Ncodes x Ncodes) uint8 table of check_codes() scores,
+    score_matrix()[i, j] == score_codes(i, j).
+    Built with numpy the first time it is asked for, then reused;
+    None if there are more than Dense_codes codes.
+
+    >>> table = score_matrix()
+    >>> print(table.shape, table[0, 0], table[1, 6])
+    (1296, 1296) 40 22
+    """
+    global _score_table
+    if _score_table is None and Ncolors**Nholes <= Dense_codes:
+        codes = all_codes()
+        _score_table = score_codes(codes[:, np.newaxis],
+                                   codes[np.newaxis, :])
+    return _score_table
+
+
+# the score table, filled in by score_matrix() when first needed
+_score_table = None
+
+
+def digit_table(codes):
+    """
+    Return the digits (Nholes x Ncodes) and color counts (Ncolors x Ncodes)
+    of the codes, laid out for score_row() to go down them quickly.
+    """
+    digits = code_digits(codes)
+    return (np.ascontiguousarray(digits.T),
+            np.ascontiguousarray(color_counts(digits).T))
+
+
+def score_row(guess_code, poss_table):
+    """
+    Return the scores of the guess code against the codes whose
+    digit_table() is poss_table, one vector operation per color in the
+    guess and per hole.
+
+    >>> print(score_row(7, digit_table([7, 0, 42, 1295])))
+    [40 20 22  0]
+    """
+    poss_digits, poss_counts = poss_table
+    guess_digits = code_digits(guess_code)
+    guess_counts = color_counts(guess_digits)
+    scores = np.zeros(poss_digits.shape[1], dtype=np.uint8)
+    # colors not in the guess add nothing to the minimums
+    for iclr in np.flatnonzero(guess_counts):
+        scores += np.minimum(poss_counts[iclr], guess_counts[iclr])
+    for ihole in range(Nholes):
+        np.add(scores, 9, out=scores,
+               where=(poss_digits[ihole] == guess_digits[ihole]))
+    return scores
 
 
 def check_codes(in1, in2):
@@ -79,59 +265,529 @@ def check_codes(in1, in2):
 
 def prune_possible(poss_codes, guess_code, score):
     """
-    Go through the possible codes and score them compared to
-    the guess code, keep only the ones that give the score value.
+    Keep only the possible codes (an array of packed codes) that give
+    the score value when compared to the guess code.
+    This is a single lookup in the guess code's row of score_matrix(),
+    or scoring chunks of Chunk_pairs codes at a time if there is no table.
+
+    >>> poss = all_codes()
+    >>> print(len(prune_possible(poss, 7, 40)),
+    ...       len(prune_possible(poss, 7, 0)))
+    1 256
+    """
+    poss_codes = np.asarray(poss_codes)
+    table = score_matrix()
+    if table is not None:
+        return poss_codes[table[guess_code, poss_codes] == score]
+    keep = [chunk[score_row(guess_code, digit_table(chunk)) == score]
+            for chunk in np.array_split(
+                poss_codes, 1 + len(poss_codes) // Chunk_pairs)]
+    return np.concatenate(keep)
+
+
+def score_counts(guess_codes, poss_codes):
+    """
+    For each guess code return how many of the possible codes give each
+    score value, i.e. the bincount of the guess code's scores
+    over the possible codes; one row of counts per guess.
+    From score_matrix(), in chunks of at most Chunk_pairs scores,
+    or with no table one score_row() at a time.
+
+    >>> counts = score_counts([7], all_codes())
+    >>> print(counts.shape, counts[0, 40], counts[0, 0], counts.sum())
+    (1, 41) 1 256 1296
+    """
+    nscores = 10 * Nholes + 1
+    guess_codes = np.asarray(guess_codes)
+    poss_codes = np.asarray(poss_codes)
+    counts = np.zeros((len(guess_codes), nscores), dtype=np.int64)
+    table = score_matrix()
+    if table is None:
+        poss_table = digit_table(poss_codes)
+        for iguess, guess_code in enumerate(guess_codes):
+            counts[iguess] = np.bincount(score_row(guess_code, poss_table),
+                                         minlength=nscores)
+        return counts
+    chunk_size = max(1, Chunk_pairs // max(1, len(poss_codes)))
+    for istart in range(0, len(guess_codes), chunk_size):
+        chunk = guess_codes[istart:istart + chunk_size]
+        scores = table[np.ix_(chunk, poss_codes)].astype(np.intp)
+        # offset each guess's scores so one bincount does all the rows
+        scores += nscores * np.arange(len(chunk))[:, np.newaxis]
+        counts[istart:istart + len(chunk)] = np.bincount(
+            scores.ravel(), minlength=nscores * len(chunk)).reshape(
+                len(chunk), nscores)
+    return counts
+
+
+def minimax_cost(counts):
+    """ Knuth: the largest number of codes that could be left. """
+    return counts.max(axis=1).astype(float)
+
+
+def expected_cost(counts):
+    """ The expected number of codes left (times the number possible). """
+    counts = counts.astype(float)
+    return (counts * counts).sum(axis=1)
+
+
+def entropy_cost(counts):
+    """ Minus the entropy of the score distribution (in bits). """
+    probs = counts / counts.sum(axis=1)[:, np.newaxis]
+    logs = np.log2(np.where(probs > 0, probs, 1.0))
+    return (probs * logs).sum(axis=1)
+
+
+# the guess scoring functions; lower cost is better for all of them
+Cost_funcs = {'minimax': minimax_cost,
+              'expected': expected_cost,
+              'entropy': entropy_cost}
+
+
+def init_worker(game):
+    """
+    Set up a worker process to play the game, (Ncolors, Nholes), without
+    starting worker processes of its own.
+    """
+    global Parallel_pairs, _guess_pool, _guess_pool_lock
+    # a pool copied from the parent process is not this one's to use
+    _guess_pool = None
+    _guess_pool_lock = threading.Lock()
+    if game != (Ncolors, Nholes):
+        set_game(*game)
+    Parallel_pairs = float('inf')
+
+
+def guess_pool(nworkers=None):
+    """
+    Return the worker processes that best_guess() spreads the scoring
+    over, started the first time they are needed and kept for the rest
+    of the game (a new pool if nworkers is different).
+    """
+    global _guess_pool, _guess_pool_workers
+    with _guess_pool_lock:
+        if _guess_pool is not None and nworkers != _guess_pool_workers:
+            _guess_pool.shutdown()
+            _guess_pool = None
+        if _guess_pool is None:
+            _guess_pool = ProcessPoolExecutor(max_workers=nworkers,
+                                              initializer=init_worker,
+                                              initargs=((Ncolors, Nholes),))
+            _guess_pool_workers = nworkers
+        return _guess_pool
+
+
+def close_guess_pool():
+    """
+    Stop the guess_pool() worker processes, if there are any.
+    """
+    global _guess_pool
+    with _guess_pool_lock:
+        if _guess_pool is not None:
+            _guess_pool.shutdown()
+            _guess_pool = None
+
+
+# the guess_pool(), its nworkers, and a lock as it can be asked for
+# from more than one thread
+_guess_pool = None
+_guess_pool_workers = None
+_guess_pool_lock = threading.Lock()
+
+
+def guess_costs(guess_codes, poss_codes, strategy):
+    """
+    Return the strategy's cost for each of the guess codes.
+    """
+    return Cost_funcs[strategy](score_counts(guess_codes, poss_codes))
+
+
+def best_guess(poss_codes, strategy=None, nworkers=None):
+    """
+    Pick the next guess given the array of still possible codes.
+    For the scoring strategies every code is a candidate guess (for big
+    games at most Max_candidates of the possible codes are tried);
+    ties are broken in favor of a still possible code, then the lowest
+    code. With many (guess, possible) pairs to score the candidate
+    guesses are split among nworkers processes (default: one per cpu),
+    the guess_pool(), which is kept for the next guesses.
+
+    >>> print(code_names(best_guess(all_codes(), 'minimax')))
+    ['Red', 'Red', 'Yel', 'Yel']
+    """
+    if strategy is None:
+        strategy = Strategy
+    poss_codes = np.asarray(poss_codes)
+    if strategy == 'random' or len(poss_codes) <= 2:
+        # with 1 or 2 possible, guessing one of them is best anyway
+        return random.choice(poss_codes)
+    if strategy not in Cost_funcs:
+        raise ValueError("Unknown strategy: " + str(strategy))
+    if Ncolors**Nholes <= Max_candidates:
+        guess_codes = all_codes()
+    elif len(poss_codes) <= Max_candidates:
+        guess_codes = poss_codes
+    else:
+        guess_codes = np.sort(np.random.choice(poss_codes, Max_candidates,
+                                               replace=False))
+    if nworkers != 1 and len(guess_codes) * len(poss_codes) > Parallel_pairs:
+        nchunks = 4 * (nworkers or os.cpu_count() or 1)
+        chunks = np.array_split(guess_codes, nchunks)
+        costs = np.concatenate(list(guess_pool(nworkers).map(
+            guess_costs, chunks, len(chunks) * [poss_codes],
+            len(chunks) * [strategy])))
+    else:
+        costs = guess_costs(guess_codes, poss_codes, strategy)
+    # lowest cost, preferring a code that could be the answer
+    best = guess_codes[costs == costs.min()]
+    is_poss = np.isin(best, poss_codes)
+    if is_poss.any():
+        best = best[is_poss]
+    return best[0]
+
+
+def next_guess(poss_codes, history, strategy=None, book=None):
+    """
+    Pick the next guess, from the book if one is given.
+    """
+    if book is None or book.strategy == 'random':
+        return best_guess(poss_codes, strategy)
+    return book.next_guess(tuple(history), poss_codes)
+
+
+class GuessBook:
+    """
+    Cache of the guess the strategy picks after each game history,
+    the tuple of (guess, score) pairs so far; () is the starting guess.
+    For a given strategy, Ncolors and Nholes the history determines the
+    possible codes and so the guess, so a branch is only worked out once.
+    The book is loaded from file_name (if there, and load is True) when
+    it is made, and save() writes it back as a compressed numpy .npz file.
+    Games in different threads can share a book.
+    """
+
+    def __init__(self, strategy=None, file_name=None, max_size=None,
+                 load=True):
+        if strategy is None:
+            strategy = Strategy
+        if file_name is None:
+            file_name = Book_file.format(strategy, Ncolors, Nholes)
+        if max_size is None:
+            max_size = Book_size
+        self.strategy = strategy
+        self.file_name = file_name
+        self.max_size = max_size
+        self.guesses = OrderedDict()
+        self.changed = False
+        self.lock = threading.Lock()
+        if load and os.path.exists(file_name):
+            self.load()
+
+    def __len__(self):
+        return len(self.guesses)
+
+    def get(self, history):
+        # return the guess for this history, or None if not known
+        with self.lock:
+            guess = self.guesses.get(history)
+            if guess is not None:
+                self.guesses.move_to_end(history)
+        return guess
+
+    def put(self, history, guess):
+        with self.lock:
+            self.guesses[history] = guess
+            self.guesses.move_to_end(history)
+            while len(self.guesses) > self.max_size:
+                self.guesses.popitem(last=False)
+            self.changed = True
+
+    def next_guess(self, history, poss_codes):
+        """
+        Return the guess for this history, working it out with
+        best_guess() if it is not in the book yet.
+        """
+        guess = self.get(history)
+        if guess is None:
+            guess = best_guess(poss_codes, self.strategy)
+            self.put(history, guess)
+        return guess
+
+    def save(self):
+        # each history is stored as its length and its guesses and scores
+        # appended to flat arrays; oldest entries first
+        histories = list(self.guesses.keys())
+        code_type = np.min_scalar_type(Ncolors**Nholes - 1)
+        hist_guesses = [guess for hist in histories for guess, _ in hist]
+        hist_scores = [score for hist in histories for _, score in hist]
+        np.savez_compressed(
+            self.file_name,
+            config=np.array([Ncolors, Nholes]),
+            strategy=np.array(self.strategy),
+            lengths=np.array([len(hist) for hist in histories], np.uint8),
+            hist_guesses=np.array(hist_guesses, code_type),
+            hist_scores=np.array(hist_scores, np.uint8),
+            guesses=np.array(list(self.guesses.values()), code_type))
+        self.changed = False
+
+    def load(self):
+        with np.load(self.file_name) as book:
+            # ignore a book made for some other game
+            if (list(book['config']) != [Ncolors, Nholes] or
+                    str(book['strategy']) != self.strategy):
+                return
+            ends = np.cumsum(book['lengths']).tolist()
+            starts = [0] + ends[:-1]
+            hist_guesses = book['hist_guesses'].tolist()
+            hist_scores = book['hist_scores'].tolist()
+            for istart, iend, guess in zip(starts, ends,
+                                           book['guesses'].tolist()):
+                history = tuple(zip(hist_guesses[istart:iend],
+                                    hist_scores[istart:iend]))
+                self.guesses[history] = guess
+        while len(self.guesses) > self.max_size:
+            self.guesses.popitem(last=False)
+
+
+class SolverSession:
+    """
+    One game worked out without any input() or print():
+    the first guess (a code index) is in .guess, then each call of
+    add_score(score) returns the next guess, or None once it is solved.
+    All sessions share the same score_matrix() and, if given, book.
+
+    >>> session = SolverSession('minimax')
+    >>> secret = 1000
+    >>> while session.guess is not None:
+    ...     guess = session.add_score(score_codes(session.guess, secret))
+    >>> print(session.num_guesses, session.history[-1])
+    5 (1000, 40)
+    """
+
+    def __init__(self, strategy=None, book=None):
+        if strategy is None:
+            strategy = Strategy
+        self.strategy = strategy
+        self.book = book
+        # shared by all the sessions until the first score is added
+        self.possible_codes = all_codes()
+        # the (guess, score) pairs so far
+        self.history = ()
+        self.guess = next_guess(self.possible_codes, self.history,
+                                strategy, book)
+        self.num_guesses = 1
+
+    def add_score(self, score):
+        """
+        Take the score of the current guess and return the next guess,
+        None if solved; a ValueError if no code can give these scores.
+        """
+        if self.guess is None:
+            raise ValueError("Game is already solved")
+        score = int(score)
+        self.history += ((int(self.guess), score),)
+        if score == 10 * Nholes:
+            self.guess = None
+            return None
+        # remove not possible codes
+        self.possible_codes = prune_possible(self.possible_codes,
+                                             self.guess, score)
+        if len(self.possible_codes) == 0:
+            self.guess = None
+            raise ValueError("No code gives these scores")
+        self.guess = next_guess(self.possible_codes, self.history,
+                                self.strategy, self.book)
+        self.num_guesses += 1
+        return self.guess
+
+
+async def play_async(ask_score, strategy=None, book=None):
+    """
+    Play one game, awaiting ask_score(guess_names) for each score.
+    Returns the number of guesses taken.
+    Many of these can run at once in one event loop, e.g. with
+    asyncio.gather(). A guess not in the book can take seconds to work
+    out for big games, so the guesses are done in the loop's default
+    executor (threads) and the other games go on meanwhile.
+    """
+    loop = asyncio.get_running_loop()
+    session = await loop.run_in_executor(None, SolverSession, strategy,
+                                         book)
+    while session.guess is not None:
+        score = await ask_score(code_names(session.guess))
+        await loop.run_in_executor(None, session.add_score, score)
+    return session.num_guesses
+
+
+async def serve_client(reader, writer, strategy=None, book=None):
+    """
+    Play a game over a stream connection: send each guess as a line of
+    color names, read back a line with its score (10*black# + white#).
     """
-    out_codes = list()
-    for ind in range(len(poss_codes)):
-        if check_codes(poss_codes[ind], guess_code) == score:
-            out_codes.append(poss_codes[ind])
-    return out_codes
+    async def ask_score(guess_names):
+        writer.write((' '.join(guess_names) + '\n').encode())
+        await writer.drain()
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("Client went away")
+        return int(line)
 
+    try:
+        num_guesses = await play_async(ask_score, strategy, book)
+        writer.write(("Got'em in " + str(num_guesses) + '\n').encode())
+    except ValueError:
+        writer.write(b"Something doesn't compute\n")
+    except ConnectionError:
+        pass
+    try:
+        await writer.drain()
+        writer.close()
+        await writer.wait_closed()
+    except ConnectionError:
+        pass
 
-def play_game():
+
+def serve_games(host='127.0.0.1', port=8642, strategy=None):
+    """
+    Serve games to any number of clients at once (e.g. telnet host port)
+    from one process, all sharing the score table and opening book.
+    Runs until interrupted, then saves the book.
+    """
+    if strategy is None:
+        strategy = Strategy
+    book = None
+    if strategy != 'random':
+        book = GuessBook(strategy)
+    score_matrix()
+
+    async def serve():
+        server = await asyncio.start_server(
+            lambda reader, writer: serve_client(reader, writer,
+                                                strategy, book),
+            host, port, backlog=4096)
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    if book is not None and book.changed:
+        book.save()
+
+
+def play_game(strategy=None, book=None):
     print("")
     print('    Starting MasterMind !')
-    possible_codes = all_codes()
-    print('Number possible codes = ', len(possible_codes))
+    print('Number possible codes = ', Ncolors**Nholes)
     print("")
     print("Enter score as:")
-    print("  10*black# + white#, e.g. 21")
+    print("  10*black# + white#, e.g. " + str(10 * (Nholes - 2) + 1))
     print("")
-    # print(possible_codes)
-    num_guesses = 0
+    if strategy is None:
+        strategy = Strategy
+    if book is None and strategy != 'random':
+        book = GuessBook(strategy)
     # Select a guess from the possible codes:
-    my_guess = random.choice(possible_codes)
-    num_guesses += 1
+    session = SolverSession(strategy, book)
     print("My starting guess : ")
-    print(" ", my_guess)
+    print(" ", code_names(session.guess))
     my_score = int(input("  What's the score? "))
     # loop until it's figured out
-    while my_score != 40:
+    while my_score != 10 * Nholes:
         print("OK, ...thinking...")
-        # remove not possible codes
-        possible_codes = prune_possible(possible_codes, my_guess, my_score)
-        # catch the case of nothing possible...
-        if len(possible_codes) == 0:
+        try:
+            my_guess = session.add_score(my_score)
+        except ValueError:
+            # catch the case of nothing possible...
             print("")
             print(" *** Hey, wait a minute! ***")
             print(" Something doesn't compute! :-(")
             return
-        print("         ...narrowed to ", len(possible_codes))
+        print("         ...narrowed to ", len(session.possible_codes))
         print("")
-        if len(possible_codes) < 10:
-            for code in possible_codes:
-                print(code)
+        if len(session.possible_codes) < 10:
+            for code in session.possible_codes:
+                print(code_names(code))
             print("")
-        my_guess = random.choice(possible_codes)
-        num_guesses += 1
         print("I'll try : ")
-        print(" ", my_guess)
+        print(" ", code_names(my_guess))
         my_score = int(input("  What's the score? "))
     # got em ;-)
+    if book is not None and book.changed:
+        book.save()
     print("")
-    print("   Hah!  Got'em!  (in " + str(num_guesses) + " guesses)")
+    print("   Hah!  Got'em!  (in " + str(session.num_guesses) + " guesses)")
     return
 
+
+def play_secrets(secrets, strategy=None, use_book=True):
+    """
+    Let the solver play against each of the secret codes, scoring its
+    guesses with score_codes(), and return the numbers of guesses taken.
+    With use_book the guesses are remembered in a fresh (not loaded from
+    or saved to disk) GuessBook while playing.
+    """
+    if strategy is None:
+        strategy = Strategy
+    book = None
+    if use_book and strategy != 'random':
+        book = GuessBook(strategy, load=False)
+    num_guesses = np.zeros(len(secrets), dtype=np.int64)
+    for isecret, secret in enumerate(secrets):
+        session = SolverSession(strategy, book)
+        while session.guess is not None:
+            session.add_score(score_codes(session.guess, secret))
+        num_guesses[isecret] = session.num_guesses
+    return num_guesses
+
+
+def benchmark(strategies=None, nsample=None, nworkers=None, use_book=True):
+    """
+    Play the solver against every secret code (or a random sample of
+    nsample of them) with each strategy, the secrets split among nworkers
+    processes (default: one per cpu). Prints and returns, by strategy,
+    the mean and worst number of guesses, the distribution of the
+    number of guesses and the wall time.
+    """
+    if strategies is None:
+        strategies = ['random'] + list(Cost_funcs)
+    if nworkers is None:
+        nworkers = os.cpu_count() or 1
+    secrets = all_codes()
+    if nsample is not None and nsample < len(secrets):
+        secrets = np.sort(np.random.choice(secrets, nsample, replace=False))
+    print("")
+    print("Playing", len(secrets), "secrets with", Ncolors, "colors,",
+          Nholes, "holes:")
+    results = dict()
+    for strategy in strategies:
+        start = time.time()
+        if nworkers == 1:
+            num_guesses = play_secrets(secrets, strategy, use_book)
+        else:
+            chunks = np.array_split(secrets, nworkers)
+            with ProcessPoolExecutor(max_workers=nworkers,
+                                     initializer=init_worker,
+                                     initargs=((Ncolors, Nholes),)) as pool:
+                num_guesses = np.concatenate(list(pool.map(
+                    play_secrets, chunks, nworkers * [strategy],
+                    nworkers * [use_book])))
+        wall_time = time.time() - start
+        results[strategy] = {'mean': num_guesses.mean(),
+                             'worst': num_guesses.max(),
+                             'counts': np.bincount(num_guesses),
+                             'wall_time': wall_time}
+        print("  {:>8s} : mean {:.4f}  worst {:2d}  time {:8.2f} s".format(
+            strategy, num_guesses.mean(), num_guesses.max(), wall_time))
+        print("             guesses:count ", ", ".join(
+            str(nguess) + ":" + str(count) for nguess, count in
+            enumerate(results[strategy]['counts']) if count > 0))
+    return results
+
 if __name__ == "__main__":
-    play_game()
+    # $ python mastermind.py bench    to see how well the solver does
+    if len(sys.argv) > 1 and sys.argv[1] == 'bench':
+        benchmark()
+    else:
+        play_game()
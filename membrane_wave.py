@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""
+Program to simulate waves on a membrane (a drumhead),
+the 2D version of string_wave.py.
+"""
+import math as m
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import matplotlib.pyplot as plt
+
+"""
+Comments on the different versions:
+v1 - square membrane, fixed edges except for a driven part of the x=0
+     edge; the same damping types and energy as string_wave.py.
+     The steps are done in bands of rows (tiles) that stay in the cache,
+     optionally spread over threads (numpy lets go of the GIL).
+"""
+# Some parameters:
+xmax = 100.0
+ymax = 100.0
+# total time and time-per-frame
+tstop = 10.0
+dtframe = 0.2
+
+Vel = 50.0  # velocity = sqrt(T/sigma)
+
+damping = 0.5
+damp_type = 0  # 2   # 0, 1, 2, 3
+
+# the part of the x=0 edge from drive_low to drive_high (in y) is driven
+amp_drive = 0.10
+drive_low = 40.0
+drive_high = 60.0
+freq_drive = 1.0 + 0.25 / 4.0  # cycles per time unit
+omega_drive = 2.0 * m.pi * freq_drive
+
+# The discretization parameters
+# - spacing of "masses" in x and y (0.1 for a 1000x1000 grid)
+h = 0.20
+# - size of simulation time step, factor times time-to-go-h;
+#   in 2D the upper limit for the factor is 1/sqrt(2);
+#   a bit less so that a frame is a whole number of steps
+dt = dtframe / m.ceil(dtframe / (0.7 * h / Vel))
+
+# The steps are done for tile_rows rows at a time, by nthreads threads
+tile_rows = 64
+nthreads = 1
+
+# Snapshots (Zs, time and energy every dtframe) are written as the run
+# goes to these memory-mapped .npy files ('{}' is Zs, times or energies),
+# or kept in memory if None; Zs are kept as snap_dtype
+snap_file = 'membrane_wave_snaps_{}.npy'
+snap_dtype = np.float32
+# don't print the energy at each frame
+quiet = False
+
+# Spatial coordinates: Zs[iy, ix] is the displacement at xs[ix], ys[iy]
+xs = np.linspace(0.0, xmax, num=int(xmax / h))
+ys = np.linspace(0.0, ymax, num=int(ymax / h))
+
+
+def laplacian(Zs, h, rows=None, out=None):
+    """
+    Return the 5-point Laplacian of Zs (0 on the edges).
+    With rows (a slice) only those rows of out are done.
+    If out is given the result goes in it instead of a new array.
+    """
+    if out is None:
+        out = np.zeros_like(Zs)
+    if rows is None:
+        rows = slice(0, len(Zs))
+    # skip the edges
+    low = max(rows.start, 1)
+    high = min(rows.stop, len(Zs) - 1)
+    if rows.start == 0:
+        out[0] = 0.0
+    if rows.stop >= len(Zs):
+        out[-1] = 0.0
+    if low >= high:
+        return out
+    inner = out[low:high, 1:-1]
+    np.multiply(Zs[low:high, 1:-1], -4.0, out=inner)
+    inner += Zs[low - 1:high - 1, 1:-1]
+    inner += Zs[low + 1:high + 1, 1:-1]
+    inner += Zs[low:high, :-2]
+    inner += Zs[low:high, 2:]
+    inner /= h**2
+    out[low:high, 0] = 0.0
+    out[low:high, -1] = 0.0
+    return out
+
+
+def calc_energy(Zs, Vs, Vel, h):
+    """
+    Calculate the total energy of the membrane
+    E_total = sigma*(h^2/2)*( Vel^2*Sum{|grad z|^2} + Sum{(dz/dt)^2} )
+    The returned value is E_total/sigma.
+    """
+    # central differences, skipping the edges
+    slopes = (Zs[1:-1, 2:] - Zs[1:-1, :-2]) / (2.0 * h)
+    energy = Vel * Vel * np.sum(slopes * slopes)
+    slopes = (Zs[2:, 1:-1] - Zs[:-2, 1:-1]) / (2.0 * h)
+    energy += Vel * Vel * np.sum(slopes * slopes)
+    energy += np.sum(Vs * Vs)
+    return (h * h / 2.0) * energy
+
+
+def drive_rows():
+    """
+    Return the slice of rows that are driven at the x=0 edge
+    """
+    return slice(int(np.searchsorted(ys, drive_low)),
+                 int(np.searchsorted(ys, drive_high, side='right')))
+
+
+def drift_tile(rows, Zs, Vs, work, times):
+    """
+    Advance rows of Zs by 1/2 a time step for each of the times
+    (the times after each 1/2 step), setting the driven edge.
+    """
+    driven = drive_rows()
+    driven = slice(max(driven.start, rows.start),
+                   min(driven.stop, rows.stop))
+    np.multiply(Vs[rows], dt / 2.0, out=work[rows])
+    for time in times:
+        Zs[rows] += work[rows]
+        # set the driven edge based on the driving function
+        if driven.start < driven.stop:
+            Zs[driven, 0] = amp_drive * m.sin(omega_drive * time)
+
+
+def kick_tile(rows, Zs, Vs, accels, work):
+    """
+    Update rows of Vs using the accels from the Zs (at n+1/2),
+    with the damping term.
+    """
+    laplacian(Zs, h, rows, out=accels)
+    accels[rows] *= Vel**2 * dt
+    Vs[rows] += accels[rows]
+    # include damping term
+    # constants are adjusted for similar effects
+    if (damp_type == 1):
+        #  - kinetic friction, decreases to 0 in finite time
+        np.abs(Vs[rows], out=accels[rows])
+        accels[rows] += 0.001
+        np.multiply(Vs[rows], dt * 0.3 * damping, out=work[rows])
+        work[rows] /= accels[rows]
+        Vs[rows] -= work[rows]
+    if (damp_type == 2):
+        #  - standard damping F_d = -sigma*V, exponential decay
+        np.multiply(Vs[rows], dt * 0.7 * damping, out=work[rows])
+        Vs[rows] -= work[rows]
+    if (damp_type == 3):
+        #  - v^2 damping, long-lived low amplitude
+        np.abs(Vs[rows], out=work[rows])
+        work[rows] *= dt * damping * 1.0
+        work[rows] *= Vs[rows]
+        Vs[rows] -= work[rows]
+
+
+def on_tiles(pool, func, tiles, *args):
+    """
+    Call func(rows, *args) for each tile of rows, with the pool's threads
+    if there is a pool; returns when all are done.
+    """
+    if pool is None:
+        for rows in tiles:
+            func(rows, *args)
+    else:
+        list(pool.map(lambda rows: func(rows, *args), tiles))
+
+
+def membrane_steps(Zs, Vs, time, nsteps, accels=None, work=None,
+                   pool=None):
+    """
+    Do nsteps time steps of size dt (leapfrog, with damping and the
+    driven edge), updating Zs and Vs in place. Returns the new time.
+    The work is done a tile of tile_rows rows at a time, on the threads
+    of pool (a ThreadPoolExecutor) if given.
+    The accels and work arrays (same shape as Zs) are used for the
+    in-between values; give them to avoid making new arrays.
+    """
+    if nsteps <= 0:
+        return time
+    if accels is None:
+        accels = np.zeros_like(Zs)
+    if work is None:
+        work = np.empty_like(Zs)
+    tiles = [slice(irow, min(irow + tile_rows, len(Zs)))
+             for irow in range(0, len(Zs), tile_rows)]
+    # advance Zs by 1/2 a time step
+    on_tiles(pool, drift_tile, tiles, Zs, Vs, work, [time + dt / 2.0])
+    for i in range(0, nsteps):
+        on_tiles(pool, kick_tile, tiles, Zs, Vs, accels, work)
+        # advance Zs by another 1/2 a time step and, unless done,
+        # by the first 1/2 of the next one
+        times = [time + dt]
+        if i < nsteps - 1:
+            times.append(time + 1.5 * dt)
+        on_tiles(pool, drift_tile, tiles, Zs, Vs, work, times)
+        time += dt
+    return time
+
+
+def new_snaps(num_frames, shape, file_name=None):
+    """
+    Return a dictionary of arrays for num_frames snapshots:
+    Zs, (num_frames,) + shape, times and energies, (num_frames,).
+    They are memory-mapped .npy files (file_name.format(name)) if a
+    file_name is given. The times start as NaN for the frames not done.
+    """
+    shapes = {'Zs': (num_frames,) + shape, 'times': (num_frames,),
+              'energies': (num_frames,)}
+    dtypes = {'Zs': snap_dtype, 'times': float, 'energies': float}
+    snaps = {}
+    for name, shape in shapes.items():
+        if file_name is None:
+            snaps[name] = np.zeros(shape, dtype=dtypes[name])
+        else:
+            snaps[name] = np.lib.format.open_memmap(
+                file_name.format(name), mode='w+', dtype=dtypes[name],
+                shape=shape)
+    snaps['times'][:] = np.nan
+    return snaps
+
+
+def read_snaps(file_name):
+    """
+    Return the snapshots saved by run_frames() as a dictionary of
+    read-only memory-mapped arrays (only the frames that were done).
+    """
+    snaps = {name: np.load(file_name.format(name), mmap_mode='r')
+             for name in ('Zs', 'times', 'energies')}
+    # they are done in order
+    num_done = np.count_nonzero(~np.isnan(snaps['times']))
+    return {name: array[:num_done] for name, array in snaps.items()}
+
+
+def run_frames(Zs, Vs, snaps):
+    """
+    Run the simulation from Zs, Vs at time 0, putting a snapshot every
+    dtframe in snaps (from new_snaps(); the first one is the start).
+    The energy is printed for each frame unless quiet.
+    """
+    time = 0.0
+    accels = np.zeros_like(Zs)
+    work = np.empty_like(Zs)
+    pool = None
+    if nthreads > 1:
+        pool = ThreadPoolExecutor(max_workers=nthreads)
+    for iframe in range(0, len(snaps['times'])):
+        if iframe > 0:
+            # do the time steps in this frame
+            time = membrane_steps(Zs, Vs, time, int(dtframe / dt), accels,
+                                  work, pool)
+        # done with this frame
+        energy = calc_energy(Zs, Vs, Vel, h)
+        if iframe > 0 and not quiet:
+            print(int(1000.0 * time + 0.5) / 1000.0, " . . . Energy = ",
+                  energy)
+        snaps['Zs'][iframe] = Zs
+        snaps['energies'][iframe] = energy
+        snaps['times'][iframe] = time
+    if pool is not None:
+        pool.shutdown()
+    for array in snaps.values():
+        if isinstance(array, np.memmap):
+            array.flush()
+
+
+def plot_snaps(snaps):
+    """
+    Show the last snapshot and the energy vs time.
+    """
+    freq_str = "  --  Frequency = " + str(int(1000.0 * freq_drive) / 1000.0)
+    plt.figure(1, [8, 8], frameon=False)
+    zmax = max(np.abs(snaps['Zs'][-1]).max(), 1.0e-12)
+    plt.imshow(snaps['Zs'][-1], origin='lower', cmap='RdBu',
+               vmin=-zmax, vmax=zmax, extent=(0.0, xmax, 0.0, ymax))
+    plt.colorbar()
+    plt.xlabel('x (units)')
+    plt.ylabel('y (units)')
+    plt.title('Membrane Displacement at Time ' +
+              str(int(1000.0 * snaps['times'][-1] + 0.5) / 1000.0) +
+              freq_str)
+
+    plt.figure(2, [10, 6], frameon=False)
+    plt.plot(snaps['times'][1:], snaps['energies'][1:], 'b')
+    plt.xlabel("Time (units)")
+    plt.ylabel("E_total")
+    plt.title("Total Energy in Membrane  vs  Time" + freq_str)
+
+    # and show the plot(s)!
+    plt.show()
+
+
+def membrane_wave():
+    """
+    Run the simulation, saving snapshots, and show the plots.
+    """
+    # initial displacement and velocity distributions, t=0: at rest
+    Zs = np.zeros((len(ys), len(xs)))
+    Vs = np.zeros_like(Zs)
+
+    num_frames = int(tstop / dtframe) + 1
+    snaps = new_snaps(num_frames + 1, Zs.shape, snap_file)
+    run_frames(Zs, Vs, snaps)
+    plot_snaps(snaps)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'plot':
+        # plot the snapshots of the last run again
+        plot_snaps(read_snaps(snap_file))
+    else:
+        membrane_wave()
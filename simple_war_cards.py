@@ -6,197 +6,177 @@ Created on Sat Jan 14 12:19:37 2017
 
 @author: dd
 """
+import random
+import sys
+from collections import deque
 import numpy as np
 import matplotlib.pyplot as plt
 
 # - - - - - - -
 
 
-def shuffle(some_list):
-    shuffled_list = []
-    for item in some_list:
-        iwhere = np.random.choice(range(0, 1 + len(shuffled_list)))
-        shuffled_list.insert(iwhere, item)
-    return shuffled_list
-# - - - - - - -
-
-# lists for the cards
-#   'player' are current cards and
-#   'pile' are the won cards
-
-player1 = []
-pile1 = []
-player2 = []
-pile2 = []
-
-# create a full deck as tuples: (number, suit)
-deck = []
-suits = ['S', 'H', 'D', 'C']
-for s in suits:
-    for icard in range(1, 14):
-        card = (icard, s)
-        deck.append(card)
-
-# shuffle the deck, twice ;-)
-deck = shuffle(shuffle(deck))
-print('\n Shuffled Deck :')
-print(deck)
-print(15 * ' ==' + '\n')
-
-# deal the cards
-for icard in range(0, len(deck), 2):
-    player1.append(deck[icard])
-    player2.append(deck[icard + 1])
-
-print(' Players dealt cards:')
-print(player1)
-print(15 * ' --')
-print(player2)
-print(15 * ' ==' + '\n')
-
-nplays = 0
-nwars = 0
-win_pile = []
-
-# fill these to make a plot
-plt_plays = [0]
-plt_cards1 = [len(player1)]
-
-# keep playing as long as both players have cards
-while (len(player1) + len(pile1) != 0) and (len(player2) + len(pile2) != 0):
-
-    # take a card from the top (= end of list) of each player's cards
-    card1 = player1.pop()
-    card2 = player2.pop()
-    nplays += 1
-    # put these cards in the win_pile
-    win_pile.append(card1)
-    win_pile.append(card2)
-
-    # is it a war ?
-    if card1[0] == card2[0]:
-        # if it is a war... add cards to win_pile and continue
-        print(3 * ' -- War -- ')
-        nwars += 1
-
-        # if a player can, put three *more* cards into the win_pile
-        if len(player1) > 2:
-            # add next 3 cards to the win_pile
-            for iadd in range(0, 3):
-                win_pile.append(player1.pop())
+def play_war(seed=None, max_plays=10000, track=False):
+    """
+    Play one game of war (no printing) and return a summary dictionary:
+    winner (1 or 2, 0 if not over after max_plays), nplays, nwars,
+    cards1 and cards2 (each player's cards at the end) and on_table
+    (cards left in a war when a player ran out).
+    With track, 'history' is also included: the play numbers and
+    player 1's number of cards after each play that was won.
+    The seed sets the shuffles, so a game can be played again.
+    """
+    rng = random.Random(seed)
+    # the suits don't matter, just the numbers
+    deck = 4 * list(range(1, 14))
+    rng.shuffle(deck)
+
+    # deal the cards:
+    #   'hand' are current cards (top = right end) and
+    #   'pile' are the won cards
+    hand1 = deque(deck[0::2])
+    hand2 = deque(deck[1::2])
+    pile1 = []
+    pile2 = []
+    win_pile = []
+    nplays = 0
+    nwars = 0
+    if track:
+        plays = [0]
+        cards1 = [len(hand1)]
+
+    # keep playing as long as both players have cards
+    while (hand1 or pile1) and (hand2 or pile2):
+        # take a card from the top of each player's cards
+        card1 = hand1.pop()
+        card2 = hand2.pop()
+        nplays += 1
+        # put these cards in the win_pile
+        win_pile.append(card1)
+        win_pile.append(card2)
+
+        if card1 == card2:
+            # if it is a war... add cards to win_pile and continue
+            nwars += 1
+            for hand, pile in ((hand1, pile1), (hand2, pile2)):
+                # if a player can, put three *more* cards into the win_pile
+                if len(hand) < 3:
+                    if len(hand) + len(pile) > 2:
+                        # pile adds enough, so use them
+                        rng.shuffle(pile)
+                        hand.extend(pile)
+                        pile.clear()
+                    else:
+                        # not enough cards: player loses
+                        win_pile += hand
+                        win_pile += pile
+                        hand.clear()
+                        pile.clear()
+                        continue
+                win_pile += (hand.pop(), hand.pop(), hand.pop())
         else:
-            if len(player1) + len(pile1) > 2:
-                # pile adds enough, so use them
-                player1 += shuffle(pile1)
-                pile1 = []
-                print(" *-* Player1 including pile for War *-*")
-                for iadd in range(0, 3):
-                    win_pile.append(player1.pop())
+            # the winner adds the cards to their pile
+            if card1 > card2:
+                pile1 += win_pile
             else:
-                # not enough cards: player loses
-                win_pile += player1 + pile1
-                player1 = []
-                pile1 = []
-
-        # same thing for player 2
-        if len(player2) > 2:
-            # add next 3 cards to the win_pile
-            for iadd in range(0, 3):
-                win_pile.append(player2.pop())
-        else:
-            if len(player2) + len(pile2) > 2:
-                # pile adds enough, so use them
-                player2 += shuffle(pile2)
-                pile2 = []
-                print(" *-* Player-2 including pile for War *-*")
-                for iadd in range(0, 3):
-                    win_pile.append(player2.pop())
-            else:
-                # not enough cards: player loses
-                win_pile += player2 + pile2
-                player2 = []
-                pile2 = []
+                pile2 += win_pile
+            win_pile.clear()
+            if track:
+                plays.append(nplays)
+                cards1.append(len(hand1) + len(pile1))
+
+        # does either player need to replenish their cards from their
+        # pile (shuffled)
+        if not hand1:
+            if not pile1:
+                break
+            rng.shuffle(pile1)
+            hand1.extend(pile1)
+            pile1.clear()
+        if not hand2:
+            if not pile2:
+                break
+            rng.shuffle(pile2)
+            hand2.extend(pile2)
+            pile2.clear()
+
+        if nplays >= max_plays:
+            break
 
-    # if not a war...
+    summary = {'winner': 0, 'nplays': nplays, 'nwars': nwars,
+               'cards1': len(hand1) + len(pile1),
+               'cards2': len(hand2) + len(pile2),
+               'on_table': len(win_pile)}
+    if summary['cards1'] == 0:
+        summary['winner'] = 2
+    elif summary['cards2'] == 0:
+        summary['winner'] = 1
+    if track:
+        if summary['winner'] != 0:
+            plays.append(nplays)
+            cards1.append(52 if summary['winner'] == 1 else 0)
+        summary['history'] = (plays, cards1)
+    return summary
+
+
+def war_stats(ngames, max_plays=10000):
+    """
+    Play ngames games (seeds 0, 1, ...) and print how they went.
+    """
+    nplays = np.zeros(ngames, dtype=int)
+    nwars = np.zeros(ngames, dtype=int)
+    winners = np.zeros(ngames, dtype=int)
+    for igame in range(ngames):
+        summary = play_war(igame, max_plays)
+        nplays[igame] = summary['nplays']
+        nwars[igame] = summary['nwars']
+        winners[igame] = summary['winner']
+    print('Games played:', ngames)
+    print('Player 1 won:', np.count_nonzero(winners == 1),
+          '  Player 2 won:', np.count_nonzero(winners == 2),
+          '  Not over:', np.count_nonzero(winners == 0))
+    print('Number of plays:  mean', nplays.mean(), '  median',
+          np.median(nplays), '  max', nplays.max())
+    print('Number of  Wars:  mean', nwars.mean())
+
+
+def plot_game(summary):
+    """
+    Plot the number of cards vs play for a game played with track.
+    """
+    plt_plays, plt_cards1 = summary['history']
+    # Close the previous plot
+    plt.close()
+    # open a plot
+    plt.figure(1, [12, 8], frameon=False)
+    # setup axes
+    plt.ylim(0.0, 52.0)
+    plt.plot([0.0, max(plt_plays)], [26.0, 26.0], 'g--')
+    plt.xlabel('Play Number')
+    plt.ylabel('Number of Cards (blue-Player1, red-Player2)')
+    # show the cards vs play
+    plt.plot(plt_plays, plt_cards1, 'b')
+    plt.plot(plt_plays, 52 - np.array(plt_cards1), 'r')
+
+    plt.title('Number of Cards vs Time')
+
+    plt.show()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        # py simple_war_cards.py 10000  - statistics of many games
+        war_stats(int(sys.argv[1]))
     else:
-        if card1[0] > card2[0]:
-            print(str(card1) + ' vs ' + str(card2) + ' : 1 wins ')
-            # add cards to 1's pile
-            pile1 += win_pile
-        else:
-            print(str(card1) + ' vs ' + str(card2) + ' : 2 wins ')
-            # add cards to 2's set
-            pile2 += win_pile
-        # empty the win_pile
-        win_pile = []
-        # and save info for plot
-        plt_plays.append(nplays)
-        plt_cards1.append(len(player1) + len(pile1))
-
-    # does either player need to replenish their cards from their pile
-    if len(player1) == 0:
-        if len(pile1) == 0:
-            print('\n\n  ***  Player 1 out of cards !  ***')
-            plt_plays.append(nplays)
-            plt_cards1.append(0)
-            break
-        else:
-            # use the pile as is (in order)
-            ##player1 = pile1[0:]
-            # better, shuffle the pile cards and use them
-            player1 = shuffle(pile1)
-            pile1 = []
-            print(" - Player1 including pile -")
-    if len(player2) == 0:
-        if len(pile2) == 0:
-            print('\n\n  ***  Player 2 out of cards !  ***')
-            plt_plays.append(nplays)
-            plt_cards1.append(52)
-            break
-        else:
-            # use the pile as is (in order)
-            ##player2 = pile2[0:]
-            # better, shuffle the pile cards and use them
-            player2 = shuffle(pile2)
-            pile2 = []
-            print(" - Player2 including pile -")
-
-    if nplays > 499:
-        print('')
-        break
-
-# Note the case of a player going out during a war
-if len(win_pile) > 0:
-    print('  (War in progress, ' + str(len(win_pile)) + ' cards on table)')
-
-print('\n Summary info:')
-print('Number of plays:', nplays)
-print('Number of  Wars:', nwars, '\n')
-print(" Player 1 cards:")
-print(player1)
-print(10 * ' --')
-print(pile1)
-print("\n Player 2 cards:")
-print(player2)
-print(10 * ' --')
-print(pile2)
-print('\n ' + str(len(player1 + pile1 + player2 +
-                      pile2 + win_pile)) + ' cards in all.\n')
-
-# - - - - Make a plot - - - -
-# Close the previous plot
-plt.close()
-# open a plot
-plt.figure(1, [12, 8], frameon=False)
-# setup axes
-plt.ylim(0.0, 52.0)
-plt.plot([0.0, max(plt_plays)], [26.0, 26.0], 'g--')
-plt.xlabel('Play Number')
-plt.ylabel('Number of Cards (blue-Player1, red-Player2)')
-# show the cards vs play
-plt.plot(plt_plays, plt_cards1, 'b')
-plt.plot(plt_plays, 52 - np.array(plt_cards1), 'r')
-
-plt.title('Number of Cards vs Time')
-
-plt.show()
+        summary = play_war(track=True)
+        # Note the case of a player going out during a war
+        if summary['on_table'] > 0:
+            print('  (War in progress, ' + str(summary['on_table']) +
+                  ' cards on table)')
+        print('\n Summary info:')
+        print('Number of plays:', summary['nplays'])
+        print('Number of  Wars:', summary['nwars'])
+        print('Winner:', summary['winner'] if summary['winner'] else
+              'none yet', '\n')
+        print(" Player 1 cards:", summary['cards1'])
+        print(" Player 2 cards:", summary['cards2'], '\n')
+        plot_game(summary)
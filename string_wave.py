@@ -3,6 +3,7 @@
 Program to simulate waves on a string.
 """
 import math as m
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 
@@ -38,26 +39,40 @@ def bump_func(xs_arg, low, high, btype):
         return Ys_out
 
 
-def d2Ydx2(Ys, h):
+def d2Ydx2(Ys, h, out=None):
     """
     Return the second spatial derivative of Ys w.r.t. x
+    (Ys can also be a 2D array of strings, one per row).
+    If out is given the result goes in it instead of a new array.
     """
-    second = 0.0 * Ys
+    if out is None:
+        out = np.empty_like(Ys)
     # skip the end points
-    for i in range(1, len(Ys) - 1):
-        second[i] = (Ys[i - 1] - 2.0 * Ys[i] + Ys[i + 1]) / (h**2)
-    return second
+    inner = out[..., 1:-1]
+    np.multiply(Ys[..., 1:-1], -2.0, out=inner)
+    inner += Ys[..., :-2]
+    inner += Ys[..., 2:]
+    inner /= h**2
+    out[..., 0] = 0.0
+    out[..., -1] = 0.0
+    return out
 
 
-def dYdx(Ys, h):
+def dYdx(Ys, h, out=None):
     """
     Return the first derivative of Ys w.r.t x
+    (Ys can also be a 2D array of strings, one per row).
+    If out is given the result goes in it instead of a new array.
     """
-    first = 0.0 * Ys
+    if out is None:
+        out = np.empty_like(Ys)
     # skip the end points
-    for i in range(1, len(Ys) - 1):
-        first[i] = (Ys[i + 1] - Ys[i - 1]) / (2.0 * h)
-    return first
+    inner = out[..., 1:-1]
+    np.subtract(Ys[..., 2:], Ys[..., :-2], out=inner)
+    inner /= 2.0 * h
+    out[..., 0] = 0.0
+    out[..., -1] = 0.0
+    return out
 
 
 def calc_energy(Ys, Vs, Vel, h):
@@ -66,10 +81,234 @@ def calc_energy(Ys, Vs, Vel, h):
     E_total = mu*(h/2)*( Vel^2*Sum{(dy/dx)^2} + Sum{(dy/dt)^2} )
     The returned value is E_total/mu.
     """
-    energy = Vel * Vel * sum(dYdx(Ys, h)**2)
-    energy += sum(Vs * Vs)
+    slopes = dYdx(Ys, h)
+    energy = Vel * Vel * np.sum(slopes * slopes, axis=-1)
+    energy += np.sum(Vs * Vs, axis=-1)
     return (h / 2.0) * energy
 
+
+def string_steps(Ys, Vs, time, nsteps, accels=None, work=None,
+                 omega=None, damp=None, dtype=None):
+    """
+    Do nsteps time steps of size dt (leapfrog, with damping and the
+    driven end Ys[0]), updating Ys and Vs in place.
+    Returns the new time.
+    The accels and work arrays (same shape as Ys) are used for the
+    in-between values; give them to avoid making new arrays.
+    The drive omega, damping and damp_type are omega_drive, damping
+    and damp_type unless given. For a batch of strings, one per row
+    of Ys, omega and damp can be arrays with a value for each row.
+    """
+    if accels is None:
+        accels = np.empty_like(Ys)
+    if work is None:
+        work = np.empty_like(Ys)
+    if omega is None:
+        omega = omega_drive
+    if damp is None:
+        damp = damping
+    if dtype is None:
+        dtype = damp_type
+    if np.ndim(damp) == 1:
+        # a column, so each row gets its own
+        damp = np.asarray(damp)[:, np.newaxis]
+    # the damping constants are adjusted for similar effects
+    if (dtype == 1):
+        damp_const = dt * 0.3 * damp
+    if (dtype == 2):
+        damp_const = dt * 0.7 * damp
+    if (dtype == 3):
+        damp_const = dt * damp * 1.0
+    for i in range(0, nsteps):
+        # advance Ys by 1/2 a time step
+        np.multiply(Vs, dt / 2.0, out=work)
+        Ys += work
+        time += dt / 2.0
+        # set Ys[0] based on the driving function
+        Ys[..., 0] = amp_drive * np.sin(omega * time)
+        # update Vs using accels from the Ys at n+1/2
+        d2Ydx2(Ys, h, out=accels)
+        accels *= Vel**2
+        accels *= dt
+        Vs += accels
+        # include damping term
+        if (dtype == 1):
+            #  - kinetic friction, decreases to 0 in finite time
+            np.abs(Vs, out=accels)
+            accels += 0.001
+            np.multiply(Vs, damp_const, out=work)
+            work /= accels
+            Vs -= work
+        if (dtype == 2):
+            #  - standard damping F_d = -mu*V, exponential decay
+            np.multiply(Vs, damp_const, out=work)
+            Vs -= work
+        if (dtype == 3):
+            #  - v^2 damping, long-lived low amplitude
+            np.abs(Vs, out=work)
+            work *= damp_const
+            work *= Vs
+            Vs -= work
+        # advance Ys by another 1/2 a time step
+        np.multiply(Vs, dt / 2.0, out=work)
+        Ys += work
+        time += dt / 2.0
+        # set Ys[0] based on the driving function
+        Ys[..., 0] = amp_drive * np.sin(omega * time)
+    return time
+
+
+def dst1(a):
+    """
+    Return the (orthonormal) type-1 discrete sine transform of a along
+    its last axis, done with an FFT. It is its own inverse.
+    """
+    npts = a.shape[-1]
+    # odd extension: 0, a, 0, -a reversed
+    ext = np.zeros(a.shape[:-1] + (2 * (npts + 1),))
+    ext[..., 1:npts + 1] = a
+    ext[..., npts + 2:] = -a[..., ::-1]
+    return (-np.sqrt(0.5 / (npts + 1)) *
+            np.fft.rfft(ext)[..., 1:npts + 1].imag)
+
+
+def string_jump(Ys, Vs, time, tjump, omega=None, damp=None, dtype=None):
+    """
+    Advance the string by tjump, updating Ys and Vs in place, exactly
+    (for the masses-on-a-string equations that string_steps() does in
+    dt steps): each sine mode of the string is a driven, damped
+    oscillator which is solved in closed form, so tjump can be any size.
+    Only for no damping or the standard damping, damp_type 0 or 2.
+    The driven end is Ys[0], the other end stays at 0.
+    Returns the new time; omega, damp and dtype are as in string_steps().
+    """
+    if omega is None:
+        omega = omega_drive
+    if damp is None:
+        damp = damping
+    if dtype is None:
+        dtype = damp_type
+    if (dtype == 0):
+        gamma = 0.0
+    elif (dtype == 2):
+        # same as the damping term in string_steps()
+        gamma = 0.7 * np.asarray(damp, dtype=float)[..., np.newaxis]
+    else:
+        raise ValueError("string_jump() needs damp_type 0 or 2, not " +
+                         str(dtype))
+    # a column, so each row can have its own
+    omega = np.asarray(omega, dtype=float)[..., np.newaxis]
+    # the modes: Vel^2 * d2Ydx2 of mode k is -lams[k] times it, and
+    # Ys[0] pushes on mode k with betas[k]
+    npts = Ys.shape[-1] - 2
+    ks = np.arange(1, npts + 1)
+    lams = (2.0 * Vel / h * np.sin(0.5 * m.pi * ks / (npts + 1)))**2
+    betas = ((Vel / h)**2 * np.sqrt(2.0 / (npts + 1)) *
+             np.sin(m.pi * ks / (npts + 1)))
+    # the steady driven motion is, with D = lams - omega^2,
+    #   amp_drive * betas * Im(exp(i omega t) / (D + i gamma omega))
+    #   = sin_amps * sin(omega t) + cos_amps * cos(omega t)
+    detunes = lams - omega**2
+    scales = amp_drive * betas / (detunes**2 + (gamma * omega)**2)
+    sin_amps = scales * detunes
+    cos_amps = -scales * gamma * omega
+    # ... and what's left of the modes is free, damped motion
+    sin_t = np.sin(omega * time)
+    cos_t = np.cos(omega * time)
+    qs = dst1(Ys[..., 1:-1]) - (sin_amps * sin_t + cos_amps * cos_t)
+    qdots = dst1(Vs[..., 1:-1]) - omega * (sin_amps * cos_t -
+                                           cos_amps * sin_t)
+    # free motion for tjump (also right if overdamped, omegas imaginary)
+    omegas = np.sqrt(lams - 0.25 * gamma**2 + 0j)
+    decay = np.exp(-0.5 * gamma * tjump)
+    coses = (decay * np.cos(omegas * tjump)).real
+    sines = (decay * tjump * np.sinc(omegas * tjump / m.pi)).real
+    new_qs = coses * qs + sines * (qdots + 0.5 * gamma * qs)
+    new_qdots = coses * qdots - sines * (lams * qs + 0.5 * gamma * qdots)
+    time += tjump
+    sin_t = np.sin(omega * time)
+    cos_t = np.cos(omega * time)
+    Ys[..., 1:-1] = dst1(new_qs + sin_amps * sin_t + cos_amps * cos_t)
+    Vs[..., 1:-1] = dst1(new_qdots + omega * (sin_amps * cos_t -
+                                              cos_amps * sin_t))
+    Ys[..., 0] = amp_drive * np.sin(omega[..., 0] * time)
+    return time
+
+
+def string_frame(Ys, Vs, time, accels, work, omega=None, damp=None,
+                 dtype=None):
+    """
+    Advance the string by a frame, dtframe, with the integrator.
+    Returns the new time.
+    """
+    if integrator == 'spectral':
+        return string_jump(Ys, Vs, time, int(dtframe / dt) * dt,
+                           omega, damp, dtype)
+    return string_steps(Ys, Vs, time, int(dtframe / dt), accels, work,
+                        omega, damp, dtype)
+
+
+def resonance_sweep(freqs, dampings=None, damp_types=None):
+    """
+    Run the string, starting at rest, for each drive frequency in freqs,
+    damping in dampings and damp_type in damp_types (the current damping
+    and damp_type if not given) up to sweep_tstop.
+    The runs with the same damp_type are done together, one string per
+    row of a 2D array.
+    Returns the steady-state energy, the average at the frame times
+    after sweep_tsettle, as an array [idamp_type, idamping, ifreq].
+    """
+    freqs = np.asarray(freqs, dtype=float)
+    if dampings is None:
+        dampings = [damping]
+    if damp_types is None:
+        damp_types = [damp_type]
+    # a row for each (damping, frequency)
+    omegas = np.tile(2.0 * m.pi * freqs, len(dampings))
+    damps = np.repeat(np.asarray(dampings, dtype=float), len(freqs))
+    num_frames = int(sweep_tstop / dtframe)
+    energies = np.zeros((len(damp_types), len(omegas)))
+    for itype, dtype in enumerate(damp_types):
+        Ys = np.zeros((len(omegas), len(xs)))
+        Vs = np.zeros((len(omegas), len(xs)))
+        accels = np.empty_like(Ys)
+        work = np.empty_like(Ys)
+        time = 0.0
+        nsettled = 0
+        iframe = 0
+        if integrator == 'spectral':
+            # go straight to the frames that are used
+            iframe = int(sweep_tsettle / dtframe)
+            time = string_jump(Ys, Vs, time, iframe * int(dtframe / dt) * dt,
+                               omegas, damps, dtype)
+        for iframe in range(iframe, num_frames):
+            time = string_frame(Ys, Vs, time, accels, work, omegas,
+                                damps, dtype)
+            if time > sweep_tsettle:
+                energies[itype] += calc_energy(Ys, Vs, Vel, h)
+                nsettled += 1
+        energies[itype] /= max(nsettled, 1)
+    return energies.reshape(len(damp_types), len(dampings), len(freqs))
+
+
+def plot_resonance(freqs, energies, dampings, damp_types):
+    """
+    Plot the energies from resonance_sweep() vs frequency,
+    a curve for each damping and damp_type.
+    """
+    plt.figure(3, [10, 6], frameon=False)
+    for itype, dtype in enumerate(damp_types):
+        for idamp, damp in enumerate(dampings):
+            plt.plot(freqs, energies[itype, idamp],
+                     label="damp_type " + str(dtype) +
+                     ", damping " + str(damp))
+    plt.xlabel("Drive Frequency (cycles per time unit)")
+    plt.ylabel("Steady-state E_total")
+    plt.title("Resonance Curve of the String")
+    plt.legend()
+    plt.show()
+
+
 """
 Comments on the different versions:
 v1 - "bump" on string is evolved and moves at Vel.
@@ -83,6 +322,12 @@ v8 - Cleaned up plots, etc.
      Can show standing waves and off-resonance beating effects.
      Adding damping removes the strong beating;
      can manually scan over the damped resonance.
+v9 - derivatives are done on whole arrays (slices), and the time steps
+     update Ys and Vs in place (string_steps), no new arrays per step.
+v10 - resonance sweep: many frequencies, dampings and damp_types run
+     together as rows of 2D arrays; "py string_wave.py sweep".
+v11 - 'spectral' integrator: exact sine-mode solution, no dt limit.
+v12 - the frames are saved (memory-mapped files) and plotted afterwards.
 """
 # Sone parameters:
 xmax = 100.0
@@ -102,6 +347,14 @@ amp_drive = 0.10
 freq_drive = 1.0 + 0.25 / 4.0  # cycles per time unit
 omega_drive = 2.0 * m.pi * freq_drive
 
+# resonance sweep: the frequencies etc. to run (see resonance_sweep),
+# each up to sweep_tstop, averaging the energy after sweep_tsettle
+sweep_freqs = np.arange(0.25, 2.0, 0.015625)
+sweep_dampings = [0.25, 0.5, 1.0]
+sweep_damp_types = [2]
+sweep_tstop = 40.0
+sweep_tsettle = 20.0
+
 # The discretization parameters
 # - spacing of "masses" in x
 #   0.2 is OK based on getting the same Energy vs time
@@ -109,103 +362,177 @@ h = 0.20
 # - size of simulation time step, factor times time-to-go-h
 #   wow: 1.0 is a sharp upper limit for a factor that works
 dt = 1.0 * h / Vel
+# how to do the time steps:
+#   'leapfrog' - steps of dt (string_steps)
+#   'spectral' - exact jumps from frame to frame (string_jump),
+#                only for damp_type 0 or 2
+integrator = 'leapfrog'
+
+# The frames (Ys, Vs, time and energy every dtframe) are written as the
+# run goes to these memory-mapped .npy files ('{}' is Ys, Vs, times or
+# energies), or kept in memory if None; "py string_wave.py plot" plots
+# the last run again
+frame_file = 'string_wave_frames_{}.npy'
+# plot every plot_every'th frame in the waterfall plot
+plot_every = 1
+# also plot the energy vs time
+plot_energy = False
+# don't print the energy at each frame
+quiet = False
 
 # Spatial coordinate
 xs = np.linspace(0.0, xmax, num=int(xmax / h))
 
-# initial spatial distribution, t=0
-#  - string at rest:
-Y0s = 0.0 * xs
-#  - string with bunp(s) on it
-# Y0s = 0.2*(bump_func(xs, 17.0, 23.0, 0) + bump_func(xs, 55.0, 85.0, 0))
-
-# initial velocity distribution
-V0s = 0.0 * Y0s
-# initial time
-time = 0.0
-
-# setup the working YS and Vs
-Ys = 1.0 * Y0s
-Vs = 1.0 * V0s
-
-# the accelerations now, t=0
-#   accels = Vel**2 * d2Ydx2(Ys,h)
-# adjust the Vs using accels for 1/2 time step
-Vs = Vs + (dt / 2) * (Vel**2 * d2Ydx2(Ys, h))
-
-# We'll make a "waterfall" plot
-# and show the dispacement at a bunch of "frames"
-num_frames = int(tstop / dtframe) + 1
-# spread them out using dYdtime
-dYdtime = 1.0  # Y value is the time
-
-# Close the previous plot(s)
-plt.close()
-plt.close()
-plt.figure(1, [8, 8], frameon=False)
-
-# setup plot and plot the starting frame
-plt.subplot(1, 1, 1)
-plt.ylim(-1.05 * 0.2, 1.05 * 0.2 + num_frames * dtframe * dYdtime)
-plt.xlim(0.0, xs[-1])
-plt.plot(xs, Y0s, 'r')
-plt.ylabel('Displacement  at  Time (y-axis value)')
-plt.xlabel('x (units)')
-freq_str = "  --  Frequency = " + str(int(1000.0 * freq_drive) / 1000.0)
-plt.title('String Displacement' + freq_str)
-# plt.show()
-
-# setup arrays to store the total energy in the string at each frame time
-frame_Es = 0.0 * np.linspace(0.0, num_frames - 1, num=num_frames)
-frame_ts = 0.0 * frame_Es
-# and do the simulation
-for iframe in range(0, num_frames):
-    # -- do some time steps
-    last_frame_time = time
-    # do the time stpes in this frame
-    for i in range(0, int(dtframe / dt)):
-        # advance Ys by 1/2 a time step
-        Ys = Ys + (dt / 2.0) * Vs
-        time += dt / 2.0
-        # set Ys[0] based on the driving function
-        Ys[0] = amp_drive * m.sin(omega_drive * time)
-        # update Vs using accels from the Ys at n+1/2
-        Vs = Vs + dt * (Vel**2 * d2Ydx2(Ys, h))
-        # include damping term
-        # constants are adjusted for similar effects
-        if (damp_type == 1):
-            #  - kinetic friction, decreases to 0 in finite time
-            Vs = Vs - dt * 0.3 * damping * Vs / (abs(Vs) + 0.001)
-        if (damp_type == 2):
-            #  - standard damping F_d = -mu*V, exponential decay
-            Vs = Vs - dt * 0.7 * damping * Vs
-        if (damp_type == 3):
-            #  - v^2 damping, long-lived low amplitude
-            Vs = Vs - dt * damping * 1.0 * abs(Vs) * Vs
-        # advance Ys by another 1/2 a time step
-        Ys = Ys + (dt / 2.0) * Vs
-        time += dt / 2.0
-        # set Ys[0] based on the driving function
-        Ys[0] = amp_drive * m.sin(omega_drive * time)
-
-    # done with this frame
-    energy = calc_energy(Ys, Vs, Vel, h)
-    print(int(1000.0 * time + 0.5) / 1000.0, " . . . Energy = ", energy)
-    frame_Es[iframe] = energy
-    frame_ts[iframe] = time
-    # plot in blue first frame every integer time:
-    if (int(last_frame_time + 0.1 * dtframe) == int(time + 0.1 * dtframe)):
-        plt.plot(xs, Ys + time * dYdtime, 'g')
+
+def new_frames(num_frames, nxs, file_name=None):
+    """
+    Return a dictionary of arrays for num_frames frames of the string:
+    Ys and Vs, (num_frames, nxs), and times and energies, (num_frames,).
+    They are memory-mapped .npy files (file_name.format(name)) if a
+    file_name is given. The times start as NaN for the frames not done.
+    """
+    shapes = {'Ys': (num_frames, nxs), 'Vs': (num_frames, nxs),
+              'times': (num_frames,), 'energies': (num_frames,)}
+    frames = {}
+    for name, shape in shapes.items():
+        if file_name is None:
+            frames[name] = np.zeros(shape)
+        else:
+            frames[name] = np.lib.format.open_memmap(
+                file_name.format(name), mode='w+', shape=shape)
+    frames['times'][:] = np.nan
+    return frames
+
+
+def read_frames(file_name):
+    """
+    Return the frames saved by run_frames() as a dictionary of read-only
+    memory-mapped arrays, so the Ys etc. are only read when used.
+    Only the frames that were done are included.
+    """
+    frames = {name: np.load(file_name.format(name), mmap_mode='r')
+              for name in ('Ys', 'Vs', 'times', 'energies')}
+    # they are done in order
+    num_done = np.count_nonzero(~np.isnan(frames['times']))
+    return {name: array[:num_done] for name, array in frames.items()}
+
+
+def run_frames(Ys, Vs, frames):
+    """
+    Run the simulation from Ys, Vs at time 0, putting each frame,
+    every dtframe, in frames (from new_frames(); the first frame is the
+    start). The energy is printed for each frame unless quiet.
+    """
+    time = 0.0
+    # the accelerations now, t=0
+    #   accels = Vel**2 * d2Ydx2(Ys,h)
+    # adjust the Vs using accels for 1/2 time step
+    if integrator != 'spectral':
+        Vs += (dt / 2) * (Vel**2 * d2Ydx2(Ys, h))
+    # work arrays for the time steps
+    accels = np.empty_like(Ys)
+    work = np.empty_like(Ys)
+    for iframe in range(0, len(frames['times'])):
+        if iframe > 0:
+            # do the time steps in this frame
+            time = string_frame(Ys, Vs, time, accels, work)
+        # done with this frame
+        energy = calc_energy(Ys, Vs, Vel, h)
+        if iframe > 0 and not quiet:
+            print(int(1000.0 * time + 0.5) / 1000.0, " . . . Energy = ",
+                  energy)
+        frames['Ys'][iframe] = Ys
+        frames['Vs'][iframe] = Vs
+        frames['energies'][iframe] = energy
+        frames['times'][iframe] = time
+    for array in frames.values():
+        if isinstance(array, np.memmap):
+            array.flush()
+
+
+def plot_frames(frames, every=1):
+    """
+    Make the waterfall plot of every every'th frame (and the energy
+    vs time plot if plot_energy) and show them.
+    """
+    times = np.array(frames['times'])
+    num_frames = len(times)
+    nxs = frames['Ys'].shape[1]
+    plot_xs = np.linspace(0.0, xmax, num=nxs)
+    # spread them out using dYdtime
+    dYdtime = 1.0  # Y value is the time
+
+    # Close the previous plot(s)
+    plt.close()
+    plt.close()
+    plt.figure(1, [8, 8], frameon=False)
+
+    # setup plot and plot the starting frame
+    plt.subplot(1, 1, 1)
+    plt.ylim(-1.05 * 0.2, 1.05 * 0.2 + num_frames * dtframe * dYdtime)
+    plt.xlim(0.0, plot_xs[-1])
+    plt.plot(plot_xs, frames['Ys'][0], 'r')
+    plt.ylabel('Displacement  at  Time (y-axis value)')
+    plt.xlabel('x (units)')
+    freq_str = "  --  Frequency = " + str(int(1000.0 * freq_drive) / 1000.0)
+    plt.title('String Displacement' + freq_str)
+
+    for iframe in range(every, num_frames, every):
+        time = times[iframe]
+        last_frame_time = times[iframe - 1]
+        # plot in blue first frame every integer time:
+        if (int(last_frame_time + 0.1 * dtframe) ==
+                int(time + 0.1 * dtframe)):
+            color = 'g'
+        else:
+            color = 'r'
+        plt.plot(plot_xs, frames['Ys'][iframe] + time * dYdtime, color)
+
+    # plot the energy vs time
+    if plot_energy:
+        plt.figure(2, [10, 6], frameon=False)
+        plt.plot(times[1:], frames['energies'][1:], 'b')
+        plt.xlabel("Time (units)")
+        plt.ylabel("E_total")
+        plt.title("Total Energy in String  vs  Time" + freq_str)
+
+    # and show the plot(s)!
+    plt.show()
+
+
+def string_wave():
+    """
+    Run the simulation, saving the frames, and show the waterfall plot.
+    """
+    # initial spatial distribution, t=0
+    #  - string at rest:
+    Y0s = 0.0 * xs
+    #  - string with bunp(s) on it
+    # Y0s = 0.2*(bump_func(xs, 17.0, 23.0, 0) + bump_func(xs, 55.0, 85.0, 0))
+
+    # initial velocity distribution
+    V0s = 0.0 * Y0s
+
+    # setup the working YS and Vs
+    Ys = 1.0 * Y0s
+    Vs = 1.0 * V0s
+
+    # We'll make a "waterfall" plot
+    # and show the dispacement at a bunch of "frames"
+    num_frames = int(tstop / dtframe) + 1
+    frames = new_frames(num_frames + 1, len(xs), frame_file)
+    run_frames(Ys, Vs, frames)
+    plot_frames(frames, plot_every)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'sweep':
+        plot_resonance(sweep_freqs, resonance_sweep(sweep_freqs,
+                                                    sweep_dampings,
+                                                    sweep_damp_types),
+                       sweep_dampings, sweep_damp_types)
+    elif len(sys.argv) > 1 and sys.argv[1] == 'plot':
+        # plot the frames of the last run again
+        plot_frames(read_frames(frame_file), plot_every)
     else:
-        plt.plot(xs, Ys + time * dYdtime, 'r')
-
-# plot the energy vs time
-if False:
-    plt.figure(2, [10, 6], frameon=False)
-    plt.plot(frame_ts, frame_Es, 'b')
-    plt.xlabel("Time (units)")
-    plt.ylabel("E_total")
-    plt.title("Total Energy in String  vs  Time" + freq_str)
-
-# and show the plot(s)!
-plt.show()
+        string_wave()
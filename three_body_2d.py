@@ -7,16 +7,30 @@
 # run it at os command line:
 # osprompt> py three_body_2d.py
 
+# v12 - plots are drawn from a binned (2D) or decimated (3D) trajectory
+#      and can be saved to png files without a display.
+# v11 - long runs: checkpoints of the integrator state and a snapshot file
+#      of the trajectory, so a run can be resumed or extended past tmax.
+# v10 - choice of integrators: Leapfrog, Yoshida 4th order, adaptive steps;
+#      print the energy and angular momentum drifts.
+# v9 - bodies are rows of numpy arrays, so any number of them can be used;
+#      the forces for all pairs are done at once (calc_forces).
 # v8 - adjusted to run in pythonista
 # v7 - put previous comments at bottom; some tweaking for PEP8.
 #      Include a 3D plot with t as the z axis (based on lines3d_demo.py)
 #      (Test using git.)
 # Shared as a gist:https://gist.github.com/f5fa24c52bc6d6087e3dc6f3c62ced09
 
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from mpl_toolkits.mplot3d import Axes3D
 import numpy as np
 import matplotlib as mpl
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 
 # max time to simulate
 tmax = 6.0
@@ -29,147 +43,804 @@ epsilon = 1.0e-4
 # Gravitational constant... (here for completeness)
 grav = 0.8
 
-# variables and initial values for each body's x,y vx,vy and mass:
-b1x = 1.0
-b1y = 0.0
-b1vx = 0.0
-b1vy = 0.5
-b1m = 3.0
-b2x = -0.5
-b2y = 0.86
-b2vx = 0.5
-b2vy = 0.0
-b2m = 4.1
-b3x = -0.5
-b3y = -0.86
-b3vx = -0.5
-b3vy = 0.0
-b3m = 3.9
-
-
-# adjust the v's so that the CM is constant (total p = 0)
-px = b1vx * b1m + b2vx * b2m + b3vx * b3m
-dv = px / (b1m + b2m + b3m)
-b1vx -= dv
-b2vx -= dv
-b3vx -= dv
-# y axis
-py = b1vy * b1m + b2vy * b2m + b3vy * b3m
-dv = py / (b1m + b2m + b3m)
-b1vy -= dv
-b2vy -= dv
-b3vy -= dv
+# how to integrate the motion:
+#   'leapfrog' - the Leapfrog steps, one force calculation per dt step
+#   'yoshida4' - Yoshida's 4th order steps (three Leapfrogs), three per step
+#   'adaptive' - Leapfrog steps sized by how close and fast the bodies are
+integrator = 'leapfrog'
+# adaptive steps are adapt_eta times the shortest r/v or free-fall time,
+# sqrt(r^3/(grav*M)), of any pair, but kept between these limits
+adapt_eta = 0.01
+adapt_dt_min = 1.0e-7
+adapt_dt_max = 0.05
+
+# how to calculate the forces:
+#   'direct' - all N^2 pairs (done in blocks of rows for big N)
+#   'tree'   - Barnes-Hut quadtree: far away groups of bodies act as one
+force_backend = 'direct'
+# direct: above this many bodies do the pairs in blocks of this many rows
+direct_block = 1000
+# tree: a group of size s at distance d is used as one body if s/d < bh_theta
+bh_theta = 0.5
+# tree: at most this many bodies in a leaf (unless at bh_max_depth)
+bh_leaf_size = 8
+bh_max_depth = 20
+
+# keep the positions at every traj_stride'th step
+traj_stride = 1
+# trajectories bigger than this many bytes are kept in a memory-mapped file
+traj_max_bytes = 2**30
+traj_file = 'three_body_2d_traj.npy'
+
+# Long runs: stream the trajectory rows to snapshot_file and save the
+# integrator state in checkpoint_file every checkpoint_rows rows, so that
+# a run can be resumed (py three_body_2d.py resume), also with a bigger tmax
+checkpointing = False
+checkpoint_rows = 500
+checkpoint_file = 'three_body_2d_checkpoint.npz'
+snapshot_file = 'three_body_2d_snaps.bin'
+
+# Ensembles: each system has a "shadow" copy started this far away,
+# brought back to this distance every lyap_steps steps to measure the
+# finite-time Lyapunov exponent
+lyap_d0 = 1.0e-8
+lyap_steps = 10
+# a body this far from the center of mass is taken as ejected
+eject_radius = 5.0
+
+# initial values for each body's x,y and vx,vy and its mass
+# (one row per body, any number of bodies can be used):
+init_poss = [[1.0, 0.0],
+             [-0.5, 0.86],
+             [-0.5, -0.86]]
+init_vels = [[0.0, 0.5],
+             [0.5, 0.0],
+             [-0.5, 0.0]]
+init_masses = [3.0, 4.1, 3.9]
 
 ##colors = np.random.rand(3)
 colors = [0.07167369,  0.6313451, 0.98]
 
-print()
-print("(", b1x, b1y, ")  (", b2x, b2y, ")  (", b3x, b3y, ")")
-print()
-# print(colors)
-
-# keep track of the locations, starting at
-xs = [b1x, b2x, b3x]
-ys = [b1y, b2y, b3y]
-
-# coming into the Leapfrog loop they want "a0", so do this:
-# calc distances squared - these are useful
-r12sq = (b2x - b1x)**2 + (b2y - b1y)**2
-r13sq = (b3x - b1x)**2 + (b3y - b1y)**2
-r23sq = (b3x - b2x)**2 + (b3y - b2y)**2
-# calc the forces
-ftemp = grav * (b1m * b2m / r12sq) / np.sqrt(r12sq + epsilon)
-f12x = ftemp * (b2x - b1x)
-f12y = ftemp * (b2y - b1y)
-ftemp = grav * (b1m * b3m / r13sq) / np.sqrt(r13sq + epsilon)
-f13x = ftemp * (b3x - b1x)
-f13y = ftemp * (b3y - b1y)
-ftemp = grav * (b2m * b3m / r23sq) / np.sqrt(r23sq + epsilon)
-f23x = ftemp * (b3x - b2x)
-f23y = ftemp * (b3y - b2y)
-# these forces can be used at step zero..
-#
-# do enough time steps to get to tmax
-totalsteps = int(tmax / dt)
-for thisstep in range(totalsteps):
-    # create the x_n+1/2 values; they replace the current x's:
-    b1x += 0.5 * dt * b1vx
-    b1y += 0.5 * dt * b1vy
-    b2x += 0.5 * dt * b2vx
-    b2y += 0.5 * dt * b2vy
-    b3x += 0.5 * dt * b3vx
-    b3y += 0.5 * dt * b3vy
-    # if it's the first time through add in acceleration:
-    if (thisstep == 0):
-        b1x += 0.25 * dt * dt * (f12x + f13x) / b1m
-        b1y += 0.25 * dt * dt * (f12y + f13y) / b1m
-        b2x += 0.25 * dt * dt * (-1.0 * f12x + f23x) / b2m
-        b2y += 0.25 * dt * dt * (-1.0 * f12y + f23y) / b2m
-        b3x += 0.25 * dt * dt * (-1.0 * f13x - f23x) / b3m
-        b3y += 0.25 * dt * dt * (-1.0 * f13y - f23y) / b3m
-    # do the force calculations for the x_n+1/2 values:
-    # calc distances squared - these are useful
-    r12sq = (b2x - b1x)**2 + (b2y - b1y)**2
-    r13sq = (b3x - b1x)**2 + (b3y - b1y)**2
-    r23sq = (b3x - b2x)**2 + (b3y - b2y)**2
-    # calc the forces
-    ftemp = grav * (b1m * b2m / r12sq) / np.sqrt(r12sq + epsilon)
-    f12x = ftemp * (b2x - b1x)
-    f12y = ftemp * (b2y - b1y)
-    ftemp = grav * (b1m * b3m / r13sq) / np.sqrt(r13sq + epsilon)
-    f13x = ftemp * (b3x - b1x)
-    f13y = ftemp * (b3y - b1y)
-    ftemp = grav * (b2m * b3m / r23sq) / np.sqrt(r23sq + epsilon)
-    f23x = ftemp * (b3x - b2x)
-    f23y = ftemp * (b3y - b2y)
-    # update the velocities to v_n+1
-    b1vx += dt * (f12x + f13x) / b1m
-    b1vy += dt * (f12y + f13y) / b1m
-    b2vx += dt * (-1.0 * f12x + f23x) / b2m
-    b2vy += dt * (-1.0 * f12y + f23y) / b2m
-    b3vx += dt * (-1.0 * f13x - f23x) / b3m
-    b3vy += dt * (-1.0 * f13y - f23y) / b3m
-    # update the positions to x_n+1
-    b1x += 0.5 * dt * b1vx
-    b1y += 0.5 * dt * b1vy
-    b2x += 0.5 * dt * b2vx
-    b2y += 0.5 * dt * b2vy
-    b3x += 0.5 * dt * b3vx
-    b3y += 0.5 * dt * b3vy
-    # append them to the list
-    xs += [b1x, b2x, b3x]
-    ys += [b1y, b2y, b3y]
-
-print("(", b1x, b1y, ")  (", b2x, b2y, ")  (", b3x, b3y, ")")
-print()
-
-# Show paths on 2D plot
-fig2d = plt.figure(1)
-plt.scatter(xs, ys, c=(int(len(xs) / 3)) * colors,
-            s=20, alpha=0.5, edgecolors='face')
-plt.show()
-
-if 1 == 1:
-        # Show paths in 3D
-    mpl.rcParams['legend.fontsize'] = 10
+# Plots: the trajectory is reduced to about plot_pixels points across
+# (2D: the pixels each body visited; 3D: the points that matter in each of
+# plot_pixels runs of rows), so drawing takes the same time for any length.
+plot_pixels = 800
+plot_inches = 8
+# if given, the plots are saved to these png files ('{}' is 2d or 3d)
+# instead of being shown, without needing a display
+plot_file = None
+# rows of the trajectory looked at at a time
+plot_chunk = 1000000
+
+
+def zero_momentum(vels, masses):
+    """ Adjust the v's (in place) so that the CM is constant (total p = 0)
+        vels can be (N,2) or, for an ensemble of systems, (B,N,2).  """
+    vels -= ((masses[:, np.newaxis] * vels).sum(axis=-2, keepdims=True) /
+             masses.sum())
+
+
+def calc_forces(poss, masses):
+    """ Return the (N,2) array of the total force on each body.
+        The force on i from j is
+          grav * m_i * m_j * (pos_j - pos_i) / (r_ij^2 * sqrt(r_ij^2 + eps))
+        done for all the pairs at once with (N,N) arrays.
+        For an ensemble of systems poss is (B,N,2) and so is the result.
+        With force_backend = 'tree' tree_forces() is used instead.  """
+    if poss.ndim == 2:
+        if force_backend == 'tree':
+            return tree_forces(poss, masses)
+        if len(masses) > direct_block:
+            return block_forces(poss, masses)
+    # diffs[i, j] = pos_j - pos_i
+    diffs = poss[..., np.newaxis, :, :] - poss[..., :, np.newaxis, :]
+    rsqs = (diffs * diffs).sum(axis=-1)
+    # no force of a body on itself (avoid the 0/0)
+    self_pairs = np.eye(len(masses), dtype=bool)
+    rsqs[..., self_pairs] = 1.0
+    ftemps = grav * (np.outer(masses, masses) / rsqs) / np.sqrt(rsqs + epsilon)
+    ftemps[..., self_pairs] = 0.0
+    return (ftemps[..., np.newaxis] * diffs).sum(axis=-2)
+
+
+def block_forces(poss, masses):
+    """ calc_forces() done direct_block rows (bodies) at a time,
+        so the (N,N) arrays are never made.  """
+    forces = np.empty_like(poss)
+    for istart in range(0, len(masses), direct_block):
+        rows = np.arange(istart, min(istart + direct_block, len(masses)))
+        diffs = poss[np.newaxis, :, :] - poss[rows, np.newaxis, :]
+        rsqs = (diffs * diffs).sum(axis=-1)
+        irows = np.arange(len(rows))
+        rsqs[irows, rows] = 1.0
+        ftemps = (grav * (np.outer(masses[rows], masses) / rsqs) /
+                  np.sqrt(rsqs + epsilon))
+        ftemps[irows, rows] = 0.0
+        forces[rows] = (ftemps[..., np.newaxis] * diffs).sum(axis=-2)
+    return forces
+
+
+def build_tree(poss, masses):
+    """ Build the Barnes-Hut quadtree, as arrays, one entry per node.
+        The bodies are sorted by their Morton (z-order) key so the bodies in
+        each node are a range, order[start:end]; a node's children are the
+        nodes child_start to child_start + nchild - 1 (nchild = 0 for a
+        leaf). Built a level at a time, splitting every node at that level
+        with more than bh_leaf_size bodies.  """
+    nbodies = len(masses)
+    lows = poss.min(axis=0)
+    root_size = (poss.max(axis=0) - lows).max() * (1.0 + 1.0e-9) + 1.0e-300
+    # integer x,y cell of each body at the deepest level,
+    # and its Morton key: the x,y bits interleaved
+    cells = ((poss - lows) / root_size * 2**bh_max_depth).astype(np.int64)
+    keys = np.zeros(nbodies, dtype=np.int64)
+    for ibit in range(bh_max_depth):
+        keys |= ((cells[:, 0] >> ibit) & 1) << (2 * ibit)
+        keys |= ((cells[:, 1] >> ibit) & 1) << (2 * ibit + 1)
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    # per node: level, key prefix, body range, children
+    levels = [np.zeros(1, dtype=np.int64)]
+    prefixes = [np.zeros(1, dtype=np.int64)]
+    starts = [np.zeros(1, dtype=np.int64)]
+    ends = [np.full(1, nbodies, dtype=np.int64)]
+    child_starts = []
+    nchilds = []
+    nnodes = 1
+    for level in range(bh_max_depth + 1):
+        prefix = prefixes[-1]
+        start = starts[-1]
+        end = ends[-1]
+        split = (end - start > bh_leaf_size) & (level < bh_max_depth)
+        nchild = np.zeros(len(prefix), dtype=np.int64)
+        if not split.any():
+            child_starts.append(np.zeros(len(prefix), dtype=np.int64))
+            nchilds.append(nchild)
+            break
+        # the four possible children of each node being split
+        shift = 2 * (bh_max_depth - level - 1)
+        level_keys = keys >> shift
+        kid_prefixes = (4 * prefix[split][:, np.newaxis] +
+                        np.arange(4)).ravel()
+        kid_starts = np.searchsorted(level_keys, kid_prefixes, 'left')
+        kid_ends = np.searchsorted(level_keys, kid_prefixes, 'right')
+        # keep the ones with bodies in them
+        keep = kid_ends > kid_starts
+        nchild[split] = keep.reshape(-1, 4).sum(axis=1)
+        child_start = np.zeros(len(prefix), dtype=np.int64)
+        child_start[split] = nnodes + np.cumsum(nchild[split]) - nchild[split]
+        child_starts.append(child_start)
+        nchilds.append(nchild)
+        nnodes += keep.sum()
+        levels.append(np.full(keep.sum(), level + 1, dtype=np.int64))
+        prefixes.append(kid_prefixes[keep])
+        starts.append(kid_starts[keep])
+        ends.append(kid_ends[keep])
+    tree = {'order': order,
+            'level': np.concatenate(levels),
+            'start': np.concatenate(starts),
+            'end': np.concatenate(ends),
+            'child_start': np.concatenate(child_starts),
+            'nchild': np.concatenate(nchilds)}
+    tree['size'] = root_size / 2.0**tree['level']
+    # total mass and center of mass of each node, from cumulative sums
+    sorted_masses = masses[order]
+    cum_masses = np.concatenate([[0.0], np.cumsum(sorted_masses)])
+    cum_moms = np.concatenate([np.zeros((1, 2)), np.cumsum(
+        sorted_masses[:, np.newaxis] * poss[order], axis=0)])
+    tree['mass'] = cum_masses[tree['end']] - cum_masses[tree['start']]
+    tree['com'] = ((cum_moms[tree['end']] - cum_moms[tree['start']]) /
+                   tree['mass'][:, np.newaxis])
+    return tree
+
+
+def add_pair_forces(forces, ibodies, masses_i, dxs, dys, masses_j):
+    """ Add the softened forces from bodies (or nodes) at dxs, dys with
+        masses masses_j on the bodies ibodies (in sorted order).  """
+    rsqs = dxs * dxs + dys * dys
+    ftemps = grav * (masses_i * masses_j / rsqs) / np.sqrt(rsqs + epsilon)
+    forces[:, 0] += np.bincount(ibodies, ftemps * dxs, minlength=len(forces))
+    forces[:, 1] += np.bincount(ibodies, ftemps * dys, minlength=len(forces))
+
+
+def tree_forces(poss, masses, theta=None):
+    """ Return the forces using a Barnes-Hut quadtree (build_tree()).
+        All the bodies go down the tree together: a list of (body, node)
+        pairs is checked, pairs with node size/distance < theta (default
+        bh_theta) use the node's mass at its center of mass, leaf nodes are
+        done body by body, and the other nodes are replaced by their
+        children, until the list is empty.  """
+    if theta is None:
+        theta = bh_theta
+    tree = build_tree(poss, masses)
+    order = tree['order']
+    sorted_poss = poss[order]
+    sorted_masses = masses[order]
+    forces = np.zeros_like(poss)
+    # start with every body paired with the root node
+    ibodies = np.arange(len(masses))
+    inodes = np.zeros(len(masses), dtype=np.int64)
+    while len(ibodies) > 0:
+        dxs = tree['com'][inodes, 0] - sorted_poss[ibodies, 0]
+        dys = tree['com'][inodes, 1] - sorted_poss[ibodies, 1]
+        rsqs = dxs * dxs + dys * dys
+        # don't use a node as one body if the body is in it
+        inside = ((tree['start'][inodes] <= ibodies) &
+                  (ibodies < tree['end'][inodes]))
+        far = ~inside & (tree['size'][inodes]**2 < theta * theta * rsqs)
+        add_pair_forces(forces, ibodies[far], sorted_masses[ibodies[far]],
+                        dxs[far], dys[far], tree['mass'][inodes[far]])
+        # leaves: each body in the leaf
+        leaf = ~far & (tree['nchild'][inodes] == 0)
+        leaf_bodies = ibodies[leaf]
+        leaf_starts = tree['start'][inodes[leaf]]
+        leaf_ends = tree['end'][inodes[leaf]]
+        if len(leaf_bodies) > 0:
+            for ioffset in range((leaf_ends - leaf_starts).max()):
+                jbodies = leaf_starts + ioffset
+                use = (jbodies < leaf_ends) & (jbodies != leaf_bodies)
+                ibs = leaf_bodies[use]
+                jbs = jbodies[use]
+                add_pair_forces(forces, ibs, sorted_masses[ibs],
+                                sorted_poss[jbs, 0] - sorted_poss[ibs, 0],
+                                sorted_poss[jbs, 1] - sorted_poss[ibs, 1],
+                                sorted_masses[jbs])
+        # the rest: go on to each of the node's children
+        opened = ~far & ~leaf
+        nkids = tree['nchild'][inodes[opened]]
+        kid_offsets = (np.arange(nkids.sum()) -
+                       np.repeat(np.cumsum(nkids) - nkids, nkids))
+        inodes = (np.repeat(tree['child_start'][inodes[opened]], nkids) +
+                  kid_offsets)
+        ibodies = np.repeat(ibodies[opened], nkids)
+    # back to the original body order
+    out = np.empty_like(forces)
+    out[order] = forces
+    return out
+
+
+def force_benchmark(nbodies_list=(100, 300, 1000, 3000, 10000, 30000),
+                    theta=None):
+    """ Time the direct and tree forces for random bodies in a disk,
+        print the times, the tree's rms relative force error and the
+        number of bodies above which the tree is faster.  """
+    rng = np.random.default_rng(2017)
+    crossover = None
+    print(" N    direct (s)   tree (s)   rms rel. error")
+    for nbodies in nbodies_list:
+        radii = np.sqrt(rng.random(nbodies))
+        angles = 2.0 * np.pi * rng.random(nbodies)
+        poss = np.column_stack([radii * np.cos(angles),
+                                radii * np.sin(angles)])
+        masses = rng.random(nbodies) + 0.5
+        start = time.time()
+        direct = block_forces(poss, masses)
+        direct_time = time.time() - start
+        start = time.time()
+        tree = tree_forces(poss, masses, theta)
+        tree_time = time.time() - start
+        error = np.sqrt((((tree - direct)**2).sum(axis=1) /
+                         (direct**2).sum(axis=1)).mean())
+        print("{:6d} {:10.4f} {:10.4f} {:12.2e}".format(
+            nbodies, direct_time, tree_time, error))
+        if crossover is None and tree_time < direct_time:
+            crossover = nbodies
+    print("Tree is faster from N =", crossover)
+    return crossover
+
+
+def make_traj(nrows, nbodies, file_name=None):
+    """ Return a (nrows, nbodies, 2) float64 array for a trajectory.
+        It is a numpy memory-mapped file if a file_name is given or if
+        it is bigger than traj_max_bytes (then in traj_file).  """
+    if file_name is None and 8 * nrows * nbodies * 2 > traj_max_bytes:
+        file_name = traj_file
+    if file_name is None:
+        return np.empty((nrows, nbodies, 2))
+    return np.lib.format.open_memmap(file_name, mode='w+',
+                                     shape=(nrows, nbodies, 2))
+
+
+def calc_energy(poss, vels, masses):
+    """ Return the total energy, kinetic plus potential. The potential
+        that goes with the softened force of calc_forces() is
+          -grav * m_i * m_j * asinh(sqrt(eps) / r_ij) / sqrt(eps)  """
+    kinetic = 0.5 * (masses[:, np.newaxis] * vels * vels).sum()
+    diffs = poss[np.newaxis, :, :] - poss[:, np.newaxis, :]
+    rs = np.sqrt((diffs * diffs).sum(axis=-1))
+    # each pair once
+    ipairs, jpairs = np.triu_indices(len(masses), 1)
+    potential = -(grav * masses[ipairs] * masses[jpairs] *
+                  np.arcsinh(np.sqrt(epsilon) / rs[ipairs, jpairs]) /
+                  np.sqrt(epsilon)).sum()
+    return kinetic + potential
+
+
+def calc_angmom(poss, vels, masses):
+    """ Return the total angular momentum (z component) """
+    return (masses * (poss[:, 0] * vels[:, 1] -
+                      poss[:, 1] * vels[:, 0])).sum()
+
+
+def new_monitor(nrows):
+    """ Return a dictionary to monitor the integration: the energy and
+        angular momentum at each trajectory row and the number of
+        force calculations done.  """
+    return {'energy': np.zeros(nrows), 'angmom': np.zeros(nrows),
+            'nforces': 0}
+
+
+def save_row(traj, monitor, irow, poss, vels, masses):
+    """ Save the positions in the trajectory, the energy etc. if monitoring """
+    traj[irow] = poss
+    if monitor is not None:
+        monitor['energy'][irow] = calc_energy(poss, vels, masses)
+        monitor['angmom'][irow] = calc_angmom(poss, vels, masses)
+
+
+def leapfrog(poss, vels, masses, dt, nsteps, stride=1, traj=None,
+             monitor=None, first_step=True):
+    """ Do nsteps Leapfrog steps of size dt, updating poss and vels in place.
+        Returns the trajectory: the positions, starting with the initial
+        ones, every stride steps; traj[irow, ibody] = x, y of the body at
+        step irow*stride. The trajectory array is made with make_traj()
+        unless one (of at least nsteps//stride + 1 rows) is given.
+        If a monitor (see new_monitor()) is given it is filled in.
+        first_step=False continues a run: no start-up term is added.  """
+    if traj is None:
+        traj = make_traj(nsteps // stride + 1, len(masses))
+    save_row(traj, monitor, 0, poss, vels, masses)
+    # coming into the Leapfrog loop they want "a0", so do this:
+    if first_step:
+        forces = calc_forces(poss, masses)
+    for thisstep in range(nsteps):
+        # create the x_n+1/2 values; they replace the current x's:
+        poss += 0.5 * dt * vels
+        # if it's the first time through add in acceleration:
+        if (thisstep == 0) and first_step:
+            poss += 0.25 * dt * dt * forces / masses[:, np.newaxis]
+        # do the force calculations for the x_n+1/2 values:
+        forces = calc_forces(poss, masses)
+        # update the velocities to v_n+1
+        vels += dt * forces / masses[:, np.newaxis]
+        # update the positions to x_n+1
+        poss += 0.5 * dt * vels
+        # save them in the trajectory
+        if (thisstep + 1) % stride == 0:
+            save_row(traj, monitor, (thisstep + 1) // stride,
+                     poss, vels, masses)
+    if monitor is not None:
+        monitor['nforces'] += nsteps + first_step
+    return traj
+
+
+# Yoshida's 4th order steps: drift by c*dt, kick by d*dt, ...
+yoshida_w1 = 1.0 / (2.0 - 2.0**(1.0 / 3.0))
+yoshida_w0 = -2.0**(1.0 / 3.0) * yoshida_w1
+yoshida_cs = [0.5 * yoshida_w1, 0.5 * (yoshida_w0 + yoshida_w1),
+              0.5 * (yoshida_w0 + yoshida_w1), 0.5 * yoshida_w1]
+yoshida_ds = [yoshida_w1, yoshida_w0, yoshida_w1]
+
+
+def yoshida4(poss, vels, masses, dt, nsteps, stride=1, traj=None,
+             monitor=None, first_step=True):
+    """ Do nsteps of Yoshida's 4th order steps (drift-kick-...-drift),
+        otherwise the same as leapfrog().  """
+    if traj is None:
+        traj = make_traj(nsteps // stride + 1, len(masses))
+    save_row(traj, monitor, 0, poss, vels, masses)
+    for thisstep in range(nsteps):
+        for c, d in zip(yoshida_cs, yoshida_ds):
+            poss += c * dt * vels
+            vels += d * dt * calc_forces(poss, masses) / masses[:, np.newaxis]
+        poss += yoshida_cs[-1] * dt * vels
+        if (thisstep + 1) % stride == 0:
+            save_row(traj, monitor, (thisstep + 1) // stride,
+                     poss, vels, masses)
+    if monitor is not None:
+        monitor['nforces'] += 3 * nsteps
+    return traj
+
+
+def adaptive_dt(poss, vels, masses):
+    """ Return the step size for the adaptive integrator:
+        adapt_eta times the shortest pair time, r/v or sqrt(r^3/(grav*M)),
+        kept between adapt_dt_min and adapt_dt_max.  """
+    ipairs, jpairs = np.triu_indices(len(masses), 1)
+    rs = np.sqrt(((poss[jpairs] - poss[ipairs])**2).sum(axis=1))
+    vs = np.sqrt(((vels[jpairs] - vels[ipairs])**2).sum(axis=1))
+    with np.errstate(divide='ignore'):
+        t_cross = (rs / vs).min()
+    t_fall = np.sqrt(rs**3 / (grav * (masses[ipairs] +
+                                      masses[jpairs]))).min()
+    return min(max(adapt_eta * min(t_cross, t_fall), adapt_dt_min),
+               adapt_dt_max)
+
+
+def adaptive(poss, vels, masses, dt, nsteps, stride=1, traj=None,
+             monitor=None, first_step=True):
+    """ Go to time nsteps*dt with (kick-drift-kick) Leapfrog steps whose size
+        comes from adaptive_dt(): short steps for close encounters and long
+        ones when the bodies are far apart. Steps are shortened to land on
+        the trajectory row times, every stride*dt, so the trajectory is the
+        same shape as for leapfrog().  """
+    nrows = nsteps // stride + 1
+    if traj is None:
+        traj = make_traj(nrows, len(masses))
+    save_row(traj, monitor, 0, poss, vels, masses)
+    forces = calc_forces(poss, masses)
+    nforces = 1
+    for irow in range(1, nrows):
+        # the time left to go to this row (kept per row, so the steps are
+        # the same however a run is split up, see run_checkpointed())
+        row_left = stride * dt
+        while row_left > 0.0:
+            step = adaptive_dt(poss, vels, masses)
+            # don't go past the row time (or leave a very short step)
+            if 1.01 * step >= row_left:
+                step = row_left
+            vels += 0.5 * step * forces / masses[:, np.newaxis]
+            poss += step * vels
+            forces = calc_forces(poss, masses)
+            vels += 0.5 * step * forces / masses[:, np.newaxis]
+            nforces += 1
+            row_left -= step
+        save_row(traj, monitor, irow, poss, vels, masses)
+    if monitor is not None:
+        monitor['nforces'] += nforces
+    return traj
 
-    fig = plt.figure(2)
-    ax = fig.gca(projection='3d')
 
-    # Make a z array - time!
-    zs = dt * np.array(range(totalsteps))
+# the integrators by name; all have the same arguments
+# (first_step only matters for leapfrog)
+integrators = {'leapfrog': leapfrog,
+               'yoshida4': yoshida4,
+               'adaptive': adaptive}
 
-    ax.plot(xs[0:3 * totalsteps:3], ys[0:3 * totalsteps:3], zs,
-            label='Body 1')
-    ax.plot(xs[1:3 * totalsteps:3], ys[1:3 * totalsteps:3], zs,
-            label='Body 2')
-    ax.plot(xs[2:3 * totalsteps:3], ys[2:3 * totalsteps:3], zs,
-            label='Body 3')
-    #ax.plot(x, y, z, label='parametric curve')
-    #ax.plot(x, y, 0.5*z, label='squished curve')
+# snapshot files start with this and then the number of bodies (int64)
+snap_magic = b'TB2DSNAP'
+snap_header = 16
+
+
+def open_snapshots(file_name, nbodies, nrows=0):
+    """ Open a snapshot file for appending rows of positions (raw float64).
+        A new one is started if nrows is 0, otherwise the existing one is
+        cut back to nrows rows (any after the last checkpoint are lost).  """
+    if nrows == 0:
+        snaps = open(file_name, 'wb')
+        snaps.write(snap_magic + np.int64(nbodies).tobytes())
+    else:
+        snaps = open(file_name, 'r+b')
+        snaps.truncate(snap_header + nrows * nbodies * 2 * 8)
+        snaps.seek(0, os.SEEK_END)
+    return snaps
+
+
+def read_snapshots(file_name=None):
+    """ Return the snapshots as a read-only (nrows, nbodies, 2) memory-mapped
+        array, so only the parts that are used get read from the disk.  """
+    if file_name is None:
+        file_name = snapshot_file
+    with open(file_name, 'rb') as snaps:
+        header = snaps.read(snap_header)
+    if header[:len(snap_magic)] != snap_magic:
+        raise ValueError(file_name + " is not a snapshot file")
+    nbodies = int(np.frombuffer(header[len(snap_magic):], np.int64)[0])
+    nrows = (os.path.getsize(file_name) - snap_header) // (nbodies * 2 * 8)
+    return np.memmap(file_name, dtype=np.float64, mode='r',
+                     offset=snap_header, shape=(nrows, nbodies, 2))
+
+
+def save_checkpoint(file_name, poss, vels, masses, step, nrows, dt, stride):
+    """ Save the integrator state: positions, velocities, current forces,
+        the step and snapshot row counts and the run settings  """
+    # write to a temporary file and rename it, so a crash while saving
+    # leaves the previous checkpoint
+    temp_name = file_name + '.tmp.npz'
+    np.savez(temp_name, poss=poss, vels=vels,
+             forces=calc_forces(poss, masses), masses=masses, step=step,
+             nrows=nrows, dt=dt, stride=stride, integrator=integrator)
+    os.replace(temp_name, file_name)
+
+
+def load_checkpoint(file_name):
+    """ Return the state saved by save_checkpoint() as a dictionary """
+    with np.load(file_name) as data:
+        return {key: data[key] for key in data.files}
+
+
+def run_checkpointed(poss, vels, masses, dt, nsteps, stride=1, resume=False):
+    """ Integrate (with integrators[integrator]) to the last whole row of
+        nsteps steps, appending the rows to snapshot_file and saving the
+        state in checkpoint_file every checkpoint_rows rows.
+        With resume the run continues from the checkpoint instead of poss,
+        vels and masses, to nsteps (which can be more than before); the
+        result is the same, bit for bit, as without the interruption.
+        Returns the positions, velocities and masses at the end.  """
+    if resume:
+        state = load_checkpoint(checkpoint_file)
+        if (state['dt'] != dt or state['stride'] != stride or
+                str(state['integrator']) != integrator):
+            raise ValueError("The checkpoint is for a different dt, "
+                             "stride or integrator")
+        poss = state['poss']
+        vels = state['vels']
+        masses = state['masses']
+        step = int(state['step'])
+        nrows = int(state['nrows'])
+        snaps = open_snapshots(snapshot_file, len(masses), nrows)
+    else:
+        step = 0
+        nrows = 1
+        snaps = open_snapshots(snapshot_file, len(masses))
+        snaps.write(poss.tobytes())
+    traj = make_traj(checkpoint_rows + 1, len(masses))
+    with snaps:
+        while nrows <= nsteps // stride:
+            seg_rows = min(checkpoint_rows, nsteps // stride + 1 - nrows)
+            integrators[integrator](poss, vels, masses, dt, seg_rows * stride,
+                                    stride, traj=traj,
+                                    first_step=(step == 0))
+            snaps.write(traj[1:seg_rows + 1].tobytes())
+            # the rows must be on the disk before the checkpoint says so
+            snaps.flush()
+            os.fsync(snaps.fileno())
+            step += seg_rows * stride
+            nrows += seg_rows
+            save_checkpoint(checkpoint_file, poss, vels, masses, step, nrows,
+                            dt, stride)
+    return poss, vels, masses
+
+
+def print_drifts(monitor):
+    """ print how much the energy and angular momentum changed """
+    energy = monitor['energy']
+    angmom = monitor['angmom']
+    print("Energy: ", energy[0], "  max drift: ",
+          np.abs(energy - energy[0]).max() / abs(energy[0]))
+    print("Ang.Mom:", angmom[0], "  max drift: ",
+          np.abs(angmom - angmom[0]).max())
+    print("Force calculations:", monitor['nforces'])
+
+
+def shadow_offsets(shape, seed=12345):
+    """ Return (B,N,2) position offsets, each lyap_d0 long (over all the
+        bodies) in a random direction, for ensemble_run()'s shadows.  """
+    offsets = np.random.default_rng(seed).normal(size=shape)
+    offsets *= lyap_d0 / np.sqrt((offsets**2).sum(axis=(1, 2)))[:, None, None]
+    return offsets
+
+
+def ensemble_run(poss, vels, masses, dt, nsteps, offsets=None):
+    """ Do nsteps Leapfrog steps for an ensemble of B systems at once:
+        poss and vels are (B,N,2) arrays (updated in place), masses is (N,).
+        The shadow systems start moved by offsets (default shadow_offsets()).
+        Returns, for each system, its finite-time Lyapunov exponent and the
+        time a body first got eject_radius from the CM (inf if never).  """
+    nbatch = len(poss)
+    # add the shadow systems, offset by lyap_d0 in a random direction
+    if offsets is None:
+        offsets = shadow_offsets(poss.shape)
+    all_poss = np.concatenate([poss, poss + offsets])
+    all_vels = np.concatenate([vels, vels])
+    log_growths = np.zeros(nbatch)
+    eject_times = np.full(nbatch, np.inf)
+    forces = calc_forces(all_poss, masses)
+    for thisstep in range(nsteps):
+        # same Leapfrog steps as in leapfrog()
+        all_poss += 0.5 * dt * all_vels
+        if (thisstep == 0):
+            all_poss += 0.25 * dt * dt * forces / masses[:, np.newaxis]
+        forces = calc_forces(all_poss, masses)
+        all_vels += dt * forces / masses[:, np.newaxis]
+        all_poss += 0.5 * dt * all_vels
+        if ((thisstep + 1) % lyap_steps == 0) or (thisstep == nsteps - 1):
+            # how far have the shadows gone (in x,y and vx,vy space)
+            dposs = all_poss[nbatch:] - all_poss[:nbatch]
+            dvels = all_vels[nbatch:] - all_vels[:nbatch]
+            dists = np.sqrt((dposs**2).sum(axis=(1, 2)) +
+                            (dvels**2).sum(axis=(1, 2)))
+            log_growths += np.log(dists / lyap_d0)
+            # and bring them back to lyap_d0 away
+            scales = (lyap_d0 / dists)[:, None, None]
+            all_poss[nbatch:] = all_poss[:nbatch] + scales * dposs
+            all_vels[nbatch:] = all_vels[:nbatch] + scales * dvels
+            # any new ejections?
+            cms = ((masses[:, np.newaxis] * all_poss[:nbatch]).sum(axis=1) /
+                   masses.sum())
+            rsqs = ((all_poss[:nbatch] - cms[:, np.newaxis, :])**2).sum(axis=2)
+            ejected = (rsqs.max(axis=1) > eject_radius**2)
+            eject_times[ejected & np.isinf(eject_times)] = (thisstep + 1) * dt
+    poss[:] = all_poss[:nbatch]
+    vels[:] = all_vels[:nbatch]
+    return log_growths / (nsteps * dt), eject_times
+
+
+def chaos_map(dxs, dys, ibody=0, nworkers=None):
+    """ Run the ensemble of systems that start like init_poss etc. but with
+        body ibody moved by each (dx, dy) of the grid of dxs and dys values,
+        up to tmax. The ensemble is split among nworkers processes
+        (default: one per cpu). Returns 2D arrays, [iy, ix], of the
+        Lyapunov exponents and the ejection times.  """
+    masses = np.array(init_masses, dtype=float)
+    grid_dxs, grid_dys = np.meshgrid(dxs, dys)
+    nbatch = grid_dxs.size
+    poss = np.tile(np.array(init_poss, dtype=float), (nbatch, 1, 1))
+    poss[:, ibody, 0] += grid_dxs.ravel()
+    poss[:, ibody, 1] += grid_dys.ravel()
+    vels = np.tile(np.array(init_vels, dtype=float), (nbatch, 1, 1))
+    zero_momentum(vels, masses)
+    # the same shadows however the grid is split among the workers
+    offsets = shadow_offsets(poss.shape)
+    totalsteps = int(tmax / dt)
+    if nworkers is None:
+        nworkers = os.cpu_count() or 1
+    nworkers = min(nworkers, nbatch)
+    if nworkers == 1:
+        lyaps, eject_times = ensemble_run(poss, vels, masses, dt, totalsteps,
+                                          offsets)
+    else:
+        ichunks = np.array_split(np.arange(nbatch), nworkers)
+        with ProcessPoolExecutor(max_workers=nworkers) as pool:
+            results = list(pool.map(
+                ensemble_run, [poss[ichunk] for ichunk in ichunks],
+                [vels[ichunk] for ichunk in ichunks], nworkers * [masses],
+                nworkers * [dt], nworkers * [totalsteps],
+                [offsets[ichunk] for ichunk in ichunks]))
+        lyaps = np.concatenate([result[0] for result in results])
+        eject_times = np.concatenate([result[1] for result in results])
+    return lyaps.reshape(grid_dxs.shape), eject_times.reshape(grid_dxs.shape)
+
+
+def print_positions(poss):
+    """ print the positions as: ( b1x b1y )  ( b2x b2y ) ... """
+    items = []
+    for ibody, (x, y) in enumerate(poss.tolist()):
+        items += ["(" if ibody == 0 else ")  (", x, y]
+    print(*(items + [")"]))
+
+
+def traj_extent(traj):
+    """ Return the smallest and biggest x and y of all the positions """
+    lows = np.full(2, np.inf)
+    highs = np.full(2, -np.inf)
+    for istart in range(0, len(traj), plot_chunk):
+        chunk = np.asarray(traj[istart:istart + plot_chunk])
+        lows = np.minimum(lows, chunk.min(axis=(0, 1)))
+        highs = np.maximum(highs, chunk.max(axis=(0, 1)))
+    return lows, highs
+
+
+def path_image(traj, lows, highs, npixels):
+    """ Return an (npixels, npixels, 4) RGBA image of the paths: the pixels
+        each body has been in are its color (later bodies on top).  """
+    nbodies = traj.shape[1]
+    scales = npixels / np.maximum(highs - lows, 1.0e-300)
+    visits = np.zeros((nbodies, npixels * npixels), dtype=bool)
+    for istart in range(0, len(traj), plot_chunk):
+        chunk = np.asarray(traj[istart:istart + plot_chunk])
+        ipixels = np.clip(((chunk - lows) * scales).astype(np.int64),
+                          0, npixels - 1)
+        for ibody in range(nbodies):
+            # row (y) major, like the image
+            visits[ibody, ipixels[:, ibody, 1] * npixels +
+                   ipixels[:, ibody, 0]] = True
+    image = np.zeros((npixels * npixels, 4))
+    for ibody in range(nbodies):
+        image[visits[ibody]] = mpl.cm.viridis(colors[ibody % len(colors)])
+    return image.reshape(npixels, npixels, 4)
+
+
+def decimate_path(traj, nbins):
+    """ Return, for each body, the rows of the trajectory to draw: in each of
+        nbins runs of rows the first, the last and those with the smallest
+        and biggest x and y. So the path drawn leaves out nothing bigger
+        than a run of rows (a pixel, when time is an axis).  """
+    nrows, nbodies = traj.shape[:2]
+    per_bin = -(-nrows // nbins)
+    if per_bin <= 2:
+        return nbodies * [np.arange(nrows)]
+    keeps = [[] for ibody in range(nbodies)]
+    chunk_rows = max(1, plot_chunk // per_bin) * per_bin
+    for istart in range(0, nrows, chunk_rows):
+        chunk = np.asarray(traj[istart:istart + chunk_rows])
+        # the last run can be short: pad it with its last row
+        npad = -len(chunk) % per_bin
+        if npad:
+            chunk = np.concatenate([chunk, np.repeat(chunk[-1:], npad, 0)])
+        starts = istart + per_bin * np.arange(len(chunk) // per_bin)
+        ends = np.minimum(starts + per_bin, nrows) - 1
+        runs = chunk.reshape(-1, per_bin, nbodies, 2)
+        # (runs, bodies, x/y) row numbers
+        mins = starts[:, None, None] + runs.argmin(axis=1)
+        maxs = starts[:, None, None] + runs.argmax(axis=1)
+        for ibody in range(nbodies):
+            keeps[ibody] += [starts, ends, mins[:, ibody].ravel(),
+                             maxs[:, ibody].ravel()]
+    return [np.minimum(np.unique(np.concatenate(keep)), nrows - 1)
+            for keep in keeps]
+
+
+def new_figure(num, file_name):
+    """ Return a figure: a pyplot one or, to save to file_name, an Agg one
+        that never opens a window  """
+    if file_name is None:
+        return plt.figure(num, figsize=(plot_inches, plot_inches))
+    fig = Figure(figsize=(plot_inches, plot_inches))
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def plot_paths(traj, file_name=None):
+    """ Plot the paths in 2D, and in 3D with time as z. They are shown
+        unless a file_name is given, then they are saved as png files
+        (file_name.format('2d') and file_name.format('3d')).  """
+    lows, highs = traj_extent(traj)
+
+    # Show paths on 2D plot
+    fig2d = new_figure(1, file_name)
+    ax = fig2d.add_subplot(111)
+    ax.imshow(path_image(traj, lows, highs, plot_pixels), origin='lower',
+              extent=(lows[0], highs[0], lows[1], highs[1]), aspect='auto',
+              interpolation='nearest')
+    if file_name is None:
+        plt.show()
+    else:
+        fig2d.savefig(file_name.format('2d'))
+
+    # Show paths in 3D
+    mpl.rcParams['legend.fontsize'] = 10
+    fig = new_figure(2, file_name)
+    ax = fig.add_subplot(111, projection='3d')
+    for ibody, irows in enumerate(decimate_path(traj, plot_pixels)):
+        xys = np.asarray(traj[irows, ibody])
+        # Make a z array - time!
+        zs = dt * traj_stride * irows
+        ax.plot(xys[:, 0], xys[:, 1], zs, label='Body ' + str(ibody + 1))
     ax.legend()
+    if file_name is None:
+        plt.show()
+    else:
+        fig.savefig(file_name.format('3d'))
+
+
+def three_body_2d(resume=False):
+    """ Run the simulation and show the plots. With resume (or checkpointing)
+        see run_checkpointed().  """
+    poss = np.array(init_poss, dtype=float)
+    vels = np.array(init_vels, dtype=float)
+    masses = np.array(init_masses, dtype=float)
+    # adjust the v's so that the CM is constant (total p = 0)
+    zero_momentum(vels, masses)
+
+    print()
+    print_positions(poss)
+    print()
+    # print(colors)
+
+    # do enough time steps to get to tmax
+    totalsteps = int(tmax / dt)
+    if checkpointing or resume:
+        poss, vels, masses = run_checkpointed(poss, vels, masses, dt,
+                                              totalsteps, traj_stride, resume)
+        traj = read_snapshots(snapshot_file)
+        monitor = None
+    else:
+        monitor = new_monitor(totalsteps // traj_stride + 1)
+        traj = integrators[integrator](poss, vels, masses, dt, totalsteps,
+                                       traj_stride, monitor=monitor)
+
+    print_positions(poss)
+    print()
+    if monitor is not None:
+        print_drifts(monitor)
+        print()
+
+    plot_paths(traj, plot_file)
+
 
-    plt.show()
+if __name__ == "__main__":
+    three_body_2d(resume=(sys.argv[1:2] == ['resume']))
 
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -